@@ -40,16 +40,31 @@ Usage examples:
     # Specify sudoers output file and target user
     TARGET_USER=你的用户名 SUDOERS_OUT=/tmp/cask_sudoers python3 gen_brew_cask_sudoers.py
 
+    # Spread rule generation over 4 worker processes (large cask sets)
+    PROCESSES=4 python3 gen_brew_cask_sudoers.py
+
 """
 
+import io
 import json
 import os
 import re
 import subprocess
 import sys
 import shutil
+import threading
 import shlex
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+import urllib.request
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+# orjson parses the (often multi‑megabyte) brew info output considerably
+# faster than the standard library.  It is optional; fall back to json.
+try:
+    import orjson  # type: ignore[import]
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None  # type: ignore[assignment]
 
 # ----------------------------------------------------------------------
 # Utility functions
@@ -60,36 +75,189 @@ def run(cmd: Iterable[str]) -> str:
     return subprocess.check_output(list(cmd), text=True).strip()
 
 
+def json_loads(data: Union[str, bytes]) -> Any:
+    """Parse JSON text, using orjson when available.
+
+    Input orjson rejects is retried with the standard library, so errors
+    are always reported as :class:`json.JSONDecodeError`.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+
+# The only cask metadata fields read by this script.  Everything else in
+# the (large) brew info records is dropped right after parsing so it is
+# neither kept in memory for the whole run nor written to the cache.
+CASK_FIELDS = ("token", "full_token", "name", "artifacts")
+
+
+def _slim_cask(cj: Dict[str, Any]) -> Dict[str, Any]:
+    """Return `cj` reduced to :data:`CASK_FIELDS`."""
+    slim = {k: cj[k] for k in CASK_FIELDS if k in cj}
+    return slim or cj
+
+
+# Per-token copies of `brew info` output.  An entry is valid while it is
+# newer than brew's downloaded cask API manifest, i.e. until the next
+# `brew update` refreshes cask definitions.
+CASK_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), "Library", "Caches", "homebrew-sudoers"
+)
+
+# Homebrew's own download/API cache on macOS when HOMEBREW_CACHE is unset.
+HOMEBREW_DEFAULT_CACHE = os.path.join(
+    os.path.expanduser("~"), "Library", "Caches", "Homebrew"
+)
+
+
+@lru_cache(maxsize=1)
+def _cask_api_mtime() -> Optional[float]:
+    """Return the mtime of brew's cask API manifest, or None if unknown.
+
+    `brew shellenv` does not export HOMEBREW_CACHE, so brew's default cache
+    location is tried before falling back to `brew --cache`, which would
+    otherwise cost a Ruby start-up on almost every run.
+    """
+    try:
+        cache = os.environ.get("HOMEBREW_CACHE")
+        if not cache:
+            default = os.path.join(HOMEBREW_DEFAULT_CACHE, "api", "cask.jws.json")
+            if os.path.exists(default):
+                return os.path.getmtime(default)
+            cache = run(["brew", "--cache"])
+        return os.path.getmtime(os.path.join(cache, "api", "cask.jws.json"))
+    except Exception:
+        return None
+
+
+def _cask_cache_path(token: str) -> str:
+    return os.path.join(CASK_CACHE_DIR, token.replace("/", "--") + ".json")
+
+
+def _load_cached_cask(token: str) -> Optional[Dict[str, Any]]:
+    """Return the cached metadata for `token` if it is still fresh."""
+    api_mtime = _cask_api_mtime()
+    if api_mtime is None:
+        return None
+    path = _cask_cache_path(token)
+    try:
+        if os.path.getmtime(path) <= api_mtime:
+            return None
+        with open(path, "rb") as fh:
+            data = json_loads(fh.read())
+    except Exception:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _store_cached_cask(token: str, cj: Dict[str, Any]) -> None:
+    """Atomically write `cj` to the cache.  Errors are ignored."""
+    if _cask_api_mtime() is None:
+        return
+    path = _cask_cache_path(token)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(CASK_CACHE_DIR, exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(cj, fh)
+        os.replace(tmp, path)
+    except Exception:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
 def fetch_cask_json(token: str) -> Optional[Dict[str, Any]]:
     """Return the cask metadata dict for `token`, or None on failure.
 
-    First attempts to call `brew info --cask --json=v2` and parse the
+    Uses the on‑disk cache when it is still fresh.  Otherwise first
+    attempts to call `brew info --cask --json=v2` and parse the
     result.  If that fails, falls back to the formulae.brew.sh API.
     Supports both legacy JSON (list or dict) and new JSON with a
     top‑level "casks" array.
     """
+    cached = _load_cached_cask(token)
+    if cached is not None:
+        return cached
     # Try local brew first
     try:
         out = run(["brew", "info", "--cask", "--json=v2", token])
-        data = json.loads(out)
+        data = json_loads(out)
         # New format: top‑level dict containing "casks"
         if isinstance(data, dict) and "casks" in data:
-            return data["casks"][0] if data["casks"] else None
+            cj = data["casks"][0] if data["casks"] else None
         # Legacy: list of one element
-        if isinstance(data, list) and data:
-            return data[0]
+        elif isinstance(data, list) and data:
+            cj = data[0]
         # Legacy: single dict
-        if isinstance(data, dict):
-            return data
+        elif isinstance(data, dict):
+            cj = data
+        else:
+            raise ValueError("unrecognised brew info output")
     except Exception:
-        pass
-    # Fallback to formulae API
-    url = f"https://formulae.brew.sh/api/cask/{token}.json"
+        # Fallback to formulae API
+        url = f"https://formulae.brew.sh/api/cask/{token}.json"
+        try:
+            with urllib.request.urlopen(url) as fh:
+                cj = json_loads(fh.read())
+        except Exception:
+            return None
+    if isinstance(cj, dict) and cj:
+        cj = _slim_cask(cj)
+        _store_cached_cask(token, cj)
+    return cj
+
+
+def fetch_all_casks_json(tokens: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Return cask metadata for many tokens from a single `brew info` call.
+
+    Each `brew` invocation pays the Ruby startup cost, so querying all
+    casks at once is much cheaper than calling :func:`fetch_cask_json`
+    per token.  Tokens with a fresh on‑disk cache entry are not queried
+    at all.  The result maps both the short and full token of every
+    returned cask to its metadata dict.  Tokens that are missing from the
+    result (or all of them, if brew fails, e.g. because one token is
+    unknown) are simply absent; callers fall back to
+    :func:`fetch_cask_json` for those.
+    """
+    mapping: Dict[str, Dict[str, Any]] = {}
+    misses: List[str] = []
+    for tok in tokens:
+        cached = _load_cached_cask(tok)
+        if cached is not None:
+            mapping[tok] = cached
+        else:
+            misses.append(tok)
+    if not misses:
+        return mapping
     try:
-        with urllib.request.urlopen(url) as fh:
-            return json.load(fh)
+        out = run(["brew", "info", "--cask", "--json=v2", *misses])
+        data = json_loads(out)
     except Exception:
-        return None
+        return mapping
+    if isinstance(data, dict) and "casks" in data:
+        casks = data["casks"]
+    elif isinstance(data, list):
+        casks = data
+    else:
+        casks = [data]
+    for cask in casks:
+        if not isinstance(cask, dict):
+            continue
+        cask = _slim_cask(cask)
+        for key in ("token", "full_token"):
+            tok = cask.get(key)
+            if isinstance(tok, str) and tok:
+                mapping.setdefault(tok, cask)
+    for tok in misses:
+        if tok in mapping:
+            _store_cached_cask(tok, mapping[tok])
+    return mapping
 
 
 def parse_artifacts(cj: Dict[str, Any]) -> List[Dict[str, Any]]:
@@ -98,28 +266,28 @@ def parse_artifacts(cj: Dict[str, Any]) -> List[Dict[str, Any]]:
     Returns a list of dictionaries, converting any two‑element list
     entries like `['app', 'Foo.app']` into `{'app': ['Foo.app']}`.  Any
     nested lists are flattened.  Non‑dict, non‑list entries are ignored.
+    Nodes are tested with exact ``type() is`` checks since the decoded JSON
+    only ever contains plain dicts and lists.
     """
-    raw = cj.get("artifacts")
     flattened: List[Dict[str, Any]] = []
-
-    def walk(node: Any) -> None:
-        if isinstance(node, dict):
+    # Depth‑first walk with an explicit stack; children are pushed in
+    # reverse so entries come out in document order.
+    stack: List[Any] = [cj.get("artifacts")]
+    while stack:
+        node = stack.pop()
+        if type(node) is dict:
             if node:
                 flattened.append(node)
-            return
-        if isinstance(node, list):
+            continue
+        if type(node) is list:
             # Two‑element list encoding: [key, value] where value may be list
             if len(node) == 2 and isinstance(node[0], str):
                 key = node[0]
                 val = node[1]
-                flattened.append({key: [val] if not isinstance(val, list) else val})
-                return
-            for item in node:
-                walk(item)
-            return
+                flattened.append({key: [val] if type(val) is not list else val})
+                continue
+            stack.extend(reversed(node))
         # Ignore scalars
-
-    walk(raw)
     return flattened
 
 
@@ -127,28 +295,64 @@ def ensure_list(x: Any) -> List[Any]:
     """Return `x` as a list: scalar -> [x], list -> x, None -> []."""
     if x is None:
         return []
-    if isinstance(x, list):
+    if type(x) is list:
         return x
     return [x]
 
 
+def extend_list(target: List[Any], x: Any) -> None:
+    """Append `x` to `target` as `ensure_list` would, without a temporary list."""
+    if x is None:
+        return
+    if type(x) is list:
+        target.extend(x)
+    else:
+        target.append(x)
+
+
 def sudo_escape(s: str) -> str:
     """Escape spaces and colons for sudoers."""
+    # Most arguments (Caskroom paths, flags, labels) need no escaping, and
+    # three membership tests are cheaper than three replace passes.
+    if " " not in s and ":" not in s and "\\" not in s:
+        return s
+    # Chained str.replace is deliberate: str.translate with multi‑character
+    # replacements is several times slower on these short arguments.
     return s.replace("\\", "\\\\").replace(" ", "\\ ").replace(":", "\\:")
 
 
 def join_command(cmd: str, args: List[str], allow_trailing_star: bool = False) -> str:
     """Join command and args with sudo escaping.  Optionally append a trailing *."""
-    parts = [sudo_escape(cmd)] + [sudo_escape(a) for a in args]
-    out = " ".join(parts)
-    if allow_trailing_star:
-        out += " *"
-    return out
+    out = sudo_escape(cmd)
+    if args:
+        out = f"{out} {' '.join(map(sudo_escape, args))}"
+    return f"{out} *" if allow_trailing_star else out
 
 
 ###############################################################################
 # Log parsing helpers
 
+# Descriptive messages and Ruby object dumps that mention /usr/bin/sudo but
+# are not commands.  Checked with a single search per log line.
+LOG_NOISE_RE = re.compile(
+    r"with `sudo`|Uninstalling packages|Changing ownership|Running installer"
+    r"|#<Cask|Cask::|@dsl_args|@directives|@cask="
+)
+
+# shlex (posix mode) splits on these four characters only.
+LOG_TOKEN_RE = re.compile(r"[^ \t\r\n]+")
+
+def _split_log_line(raw: str) -> List[str]:
+    """Split a log line into shell words, equivalent to ``shlex.split``.
+
+    Most sudo lines in brew logs contain no quoting at all, so those are
+    split with a regex; only lines with quotes or backslashes go through
+    the (much slower) shlex tokenizer.
+    """
+    if "'" in raw or '"' in raw or "\\" in raw:
+        return shlex.split(raw, posix=True)
+    return LOG_TOKEN_RE.findall(raw)
+
 
 def _find_log_command_tokens(tokens: List[str]) -> Optional[Tuple[str, List[str]]]:
     """Given a shlex‑split line, find the real command path and args after sudo.
@@ -157,301 +361,269 @@ def _find_log_command_tokens(tokens: List[str]) -> Optional[Tuple[str, List[str]
     Returns (cmd, args) or None if not found.
     """
     try:
-        idx = tokens.index("/usr/bin/sudo") + 1
+        start = tokens.index("/usr/bin/sudo") + 1
     except ValueError:
         return None
-    # Skip sudo flags like -u root -E and PATH= assignments
-    while idx < len(tokens):
+    # Single pass over the tokens after sudo, skipping sudo flags like
+    # -u root -E and PATH= assignments.
+    skip_user = False
+    for idx in range(start, len(tokens)):
         tok = tokens[idx]
+        if skip_user:
+            # username following -u
+            skip_user = False
+            continue
         # environment assignment (contains '=' but not starting with '/')
         if "=" in tok and not tok.startswith("/"):
-            idx += 1
-            continue
-        # skip sudo options (e.g. -E, -n, -u, --)
-        if tok in ("--"):
-            idx += 1
             continue
-        if tok.startswith("-"):
-            # if -u, skip next token (username)
-            if tok == "-u" and idx + 1 < len(tokens):
-                idx += 2
-                continue
-            idx += 1
+        # skip empty tokens and sudo options (e.g. -E, -n, -u, --)
+        if not tok or tok.startswith("-"):
+            skip_user = tok == "-u"
             continue
-        break
-    if idx >= len(tokens):
+        return (tok, tokens[idx + 1 :])
+    return None
+
+
+# The version directory following the first 'Caskroom/<token>/' in a path.
+CASKROOM_VERSION_RE = re.compile(r"((?:^|/)Caskroom/[^/]*/)[^/]*")
+
+
+def _wildcard_caskroom_version(path: str) -> str:
+    """Replace the Caskroom version directory in `path` with '*'.
+
+    e.g. '/opt/homebrew/Caskroom/ares-emulator/146/ares.app' ->
+    '/opt/homebrew/Caskroom/ares-emulator/*/ares.app'.
+    """
+    return CASKROOM_VERSION_RE.sub(r"\1*", path, count=1)
+
+
+def _normalize_log_cp(
+    cmd: str, args: List[str], user: str, brew_prefix: str
+) -> Optional[str]:
+    """Normalise cp: unify Caskroom version directory for the source.
+
+    Preserves flags and the destination.  The cp command in logs
+    typically has the form ``cp [options] <source> <dest>``.  We
+    identify the source as the penultimate argument and the
+    destination as the last argument, leaving any flags untouched.
+    """
+    if len(args) < 2:
+        return _normalize_log_other(cmd, args, user, brew_prefix)
+    # Determine source and destination as the last two arguments
+    src = args[-2]
+    dest = args[-1]
+    new_src = src
+    # If the source is under the Caskroom, wildcard the version
+    # directory.  Example: /opt/homebrew/Caskroom/ares-emulator/146/ares-v146/ares.app
+    if isinstance(src, str) and src.startswith(brew_prefix) and "/Caskroom/" in src:
+        new_src = _wildcard_caskroom_version(src)
+    # Additionally, wildcard numeric suffixes in the app bundle name of the
+    # source path (e.g. 'Alfred 5.app' -> 'Alfred *.app').  This makes
+    # cp rules derived from logs version‑agnostic for the source as well.
+    if isinstance(new_src, str):
+        new_src = _wildcard_app_path(new_src)
+    # Destination: do not alter case or introduce wildcards.  Leave
+    # dest unchanged because sudoers must match the actual path,
+    # including case (e.g. qBittorrent.app vs qbittorrent.app).
+    # Apply wildcarding to version numbers in the destination app bundle
+    # (e.g. 'AirParrot 3.app' -> 'AirParrot*.app'), while preserving
+    # case and other characters.  Use _wildcard_app_path to generalise
+    # numeric suffixes that follow spaces, hyphens or underscores.
+    new_dest = _wildcard_app_path(dest) if isinstance(dest, str) else dest
+    # Build a new arguments list preserving flags and replacing src/dest
+    new_args = list(args)
+    new_args[-2] = new_src
+    new_args[-1] = new_dest
+    return f"{user} ALL=(ALL) NOPASSWD: SETENV: " + join_command(cmd, new_args)
+
+
+def _normalize_log_touch(
+    cmd: str, args: List[str], user: str, brew_prefix: str
+) -> Optional[str]:
+    """Normalise touch of .homebrew-write-test.
+
+    Historically a blanket rule authorising
+    `touch /Applications/*.app/.homebrew-write-test` was emitted, but this
+    is overly permissive and could allow touching arbitrary files inside
+    any application bundle.  Instead, derive the rule from the logged
+    argument, wildcarding only the versioned portion of the app bundle
+    name.  We retain the generic rule in an unused variable for reference
+    but do not emit it.
+    """
+    # Preserve the unused generic rule for backward compatibility and
+    # debugging.  This variable is not used when constructing the
+    # returned rule, but keeping it avoids removing code.
+    _unused_generic_touch_rule = (
+        f"{user} ALL=(ALL) NOPASSWD: SETENV: /usr/bin/touch /Applications/*.app/.homebrew-write-test"
+    )
+    # If there are no arguments, skip generating a rule as it would be
+    # ambiguous which application is targeted.  Without args, return None.
+    if not args:
         return None
-    cmd = tokens[idx]
-    args = tokens[idx + 1 :]
-    return (cmd, args)
+    # Build a new argument list, wildcarding version numbers in any
+    # .homebrew-write-test path.  The reinstall log records commands
+    # like `/usr/bin/sudo touch /Applications/AppName 5.app/.homebrew-write-test`,
+    # so we use `_wildcard_app_path` to generalise `AppName 5.app` to
+    # `AppName *.app` while preserving the rest of the path.
+    new_args = []
+    for a in args:
+        if isinstance(a, str) and a.endswith(".homebrew-write-test"):
+            # Wildcard the app bundle segment inside the path
+            new_args.append(_wildcard_app_path(a))
+        else:
+            new_args.append(a)
+    return f"{user} ALL=(ALL) NOPASSWD: SETENV: " + join_command(cmd, new_args)
 
 
-def _normalize_log_command(
+def _normalize_log_rmdir(
     cmd: str, args: List[str], user: str, brew_prefix: str
 ) -> Optional[str]:
-    """Return a sudoers rule for a log‑derived command.
+    """Normalise rmdir: handle any absolute rmdir path."""
+    if not args:
+        return _normalize_log_other(cmd, args, user, brew_prefix)
+    path = args[-1]
+    # unify path using wildcard delete
+    new_path = _wildcard_delete_path(path)
+    return f"{user} ALL=(ALL) NOPASSWD: SETENV: /bin/rmdir -- {new_path}"
 
-    Applies minimal wildcarding: leaves chown owner:group unchanged (no
-    wildcard '*:staff' on the user); wildcard version directories in
-    Caskroom paths; unify .app paths; wildcard deletion targets;
-    handle common installer/cp/touch patterns.
 
-    Before performing any normalisation, resolve bare command names to
-    absolute paths.  The reinstall logs sometimes record commands like
-    ``rm`` or ``touch`` without a leading slash.  Sudoers requires
-    absolute paths, so we attempt to resolve such bare commands using
-    :func:`shutil.which` and a fallback search in common system
-    directories.  If the command cannot be resolved to an existing
-    executable, the log line is ignored (returns ``None``).
+def _normalize_log_rm(
+    cmd: str, args: List[str], user: str, brew_prefix: str
+) -> Optional[str]:
+    """Normalise rm: wildcard the final path argument only.
+
+    Preserves any existing option flags (e.g. -f, -r).  We do not insert
+    additional flags here because the sudoers entry must match the
+    command invocation's arguments to be effective.  For example,
+    a log line like ``rm /Applications/foo.app/.homebrew-write-test``
+    will produce a rule ``/usr/bin/rm /Applications/foo.app/.homebrew-write-test``,
+    whereas ``rm -f -- /Library/LaunchDaemons/com.foo.plist`` will
+    result in ``/usr/bin/rm -f -- /Library/LaunchDaemons/com.foo.plist``.
     """
-    # Ensure bare command names are resolved to absolute paths.  If cmd
-    # contains no slash, try to locate it using shutil.which.  On
-    # failure, fallback to scanning a list of common directories.
-    if cmd and not cmd.startswith("/"):
-        # Use shutil.which to honour PATH; may return None.
-        abs_cmd = shutil.which(cmd)
-        if abs_cmd:
-            cmd = abs_cmd
-        else:
-            # Fallback search in typical system directories.
-            for search_dir in ("/usr/bin", "/bin", "/usr/sbin", "/sbin"):
-                candidate = os.path.join(search_dir, cmd)
-                if os.path.exists(candidate) and os.access(candidate, os.X_OK):
-                    cmd = candidate
-                    break
-            else:
-                # Unresolvable command; skip creating a rule.
-                return None
-    # Skip obvious noise or empty commands.  Some log lines contain messages
-    # enclosed in backticks or have no real command; ignore those.
-    if not cmd or "`" in cmd:
-        return None
-    # ------------------------------------------------------------------
-    # Do not normalise chown user:group to '*:staff'.  Retain the
-    # original owner and group as logged.  This prevents generating
-    # wildcard chown rules (e.g. '*:staff') that could authorise
-    # unintended ownership changes.  The subsequent normalisation
-    # stages (cp, touch, rmdir, rm, installer, etc.) do not apply to
-    # chown and will fall through to the generic path wildcard logic.
-    if os.path.basename(cmd) == "chown" and args:
-        # No modification of args; leave owner:group unchanged
-        pass
-    # Normalise cp: unify Caskroom version directory for the source and
-    # preserve flags and the destination.  The cp command in logs
-    # typically has the form ``cp [options] <source> <dest>``.  We
-    # identify the source as the penultimate argument and the
-    # destination as the last argument, leaving any flags untouched.
-    if os.path.basename(cmd) == "cp" and len(args) >= 2:
-        # Determine source and destination as the last two arguments
-        src = args[-2]
-        dest = args[-1]
-        new_src = src
-        # If the source is under the Caskroom, wildcard the version
-        # directory.  Example: /opt/homebrew/Caskroom/ares-emulator/146/ares-v146/ares.app
-        if isinstance(src, str) and src.startswith(brew_prefix) and "/Caskroom/" in src:
-            parts = src.split("/")
-            try:
-                idx = parts.index("Caskroom")
-                # Replace the version directory with '*'
-                if idx + 2 < len(parts):
-                    parts[idx + 2] = "*"
-                new_src = "/".join(parts)
-            except ValueError:
-                new_src = src
-        # Additionally, wildcard numeric suffixes in the app bundle name of the
-        # source path (e.g. 'Alfred 5.app' -> 'Alfred *.app').  This makes
-        # cp rules derived from logs version‑agnostic for the source as well.
-        if isinstance(new_src, str):
-            new_src = _wildcard_app_path(new_src)
-        # Destination: do not alter case or introduce wildcards.  Leave
-        # dest unchanged because sudoers must match the actual path,
-        # including case (e.g. qBittorrent.app vs qbittorrent.app).
-        # Apply wildcarding to version numbers in the destination app bundle
-        # (e.g. 'AirParrot 3.app' -> 'AirParrot*.app'), while preserving
-        # case and other characters.  Use _wildcard_app_path to generalise
-        # numeric suffixes that follow spaces, hyphens or underscores.
-        new_dest = _wildcard_app_path(dest) if isinstance(dest, str) else dest
-        # Build a new arguments list preserving flags and replacing src/dest
-        new_args = list(args)
-        new_args[-2] = new_src
-        new_args[-1] = new_dest
-        return f"{user} ALL=(ALL) NOPASSWD: SETENV: " + join_command(cmd, new_args)
-    # Normalise touch of .homebrew-write-test.  Historically a blanket rule
-    # authorising `touch /Applications/*.app/.homebrew-write-test` was emitted,
-    # but this is overly permissive and could allow touching arbitrary files
-    # inside any application bundle.  Instead, derive the rule from the
-    # logged argument, wildcarding only the versioned portion of the app
-    # bundle name.  We retain the generic rule in an unused variable for
-    # reference but do not emit it.
-    if os.path.basename(cmd) == "touch":
-        # Preserve the unused generic rule for backward compatibility and
-        # debugging.  This variable is not used when constructing the
-        # returned rule, but keeping it avoids removing code.
-        _unused_generic_touch_rule = (
-            f"{user} ALL=(ALL) NOPASSWD: SETENV: /usr/bin/touch /Applications/*.app/.homebrew-write-test"
-        )
-        # If there are no arguments, skip generating a rule as it would be
-        # ambiguous which application is targeted.  Without args, return None.
-        if not args:
-            return None
-        # Build a new argument list, wildcarding version numbers in any
-        # .homebrew-write-test path.  The reinstall log records commands
-        # like `/usr/bin/sudo touch /Applications/AppName 5.app/.homebrew-write-test`,
-        # so we use `_wildcard_app_path` to generalise `AppName 5.app` to
-        # `AppName *.app` while preserving the rest of the path.
-        new_args = []
-        for a in args:
-            if isinstance(a, str) and a.endswith(".homebrew-write-test"):
-                # Wildcard the app bundle segment inside the path
-                new_args.append(_wildcard_app_path(a))
-            else:
-                new_args.append(a)
-        return f"{user} ALL=(ALL) NOPASSWD: SETENV: " + join_command(cmd, new_args)
-    # Normalise rmdir and rm paths.  Handle any absolute rmdir path.
-    if os.path.basename(cmd) == "rmdir" and args:
-        path = args[-1]
-        # unify path using wildcard delete
-        new_path = _wildcard_delete_path(path)
-        return f"{user} ALL=(ALL) NOPASSWD: SETENV: /bin/rmdir -- {new_path}"
-    if os.path.basename(cmd) == "rm" and args:
-        # For rm commands, preserve any existing option flags (e.g. -f, -r)
-        # and only wildcard the final path argument.  We do not insert
-        # additional flags here because the sudoers entry must match the
-        # command invocation's arguments to be effective.  For example,
-        # a log line like ``rm /Applications/foo.app/.homebrew-write-test``
-        # will produce a rule ``/usr/bin/rm /Applications/foo.app/.homebrew-write-test``,
-        # whereas ``rm -f -- /Library/LaunchDaemons/com.foo.plist`` will
-        # result in ``/usr/bin/rm -f -- /Library/LaunchDaemons/com.foo.plist``.
-        new_args = list(args)
-        # Replace the last argument with a wildcarded path.
-        new_args[-1] = _wildcard_delete_path(new_args[-1])
-        return f"{user} ALL=(ALL) NOPASSWD: SETENV: " + join_command(cmd, new_args)
-    # Normalise installer commands.  Handle both /usr/sbin/installer and
-    # /usr/bin/installer variants (basename == 'installer').  We collapse
-    # any target specification and verbose flags into a single wildcard
-    # argument after '-target', and wildcard version/hashes in any
-    # choice XML paths.  Simplify installer invocations into a single
-    # rule that collapses the target and verbose flags into one
-    # `-target*` token.  This avoids generating separate verbose and
-    # non‑verbose patterns and prevents the production of multiple
-    # adjacent wildcard arguments.
-    if os.path.basename(cmd) == "installer" and "-pkg" in args:
-        """
-        Normalise installer invocations from the logs.
-
-        Homebrew invokes the macOS `installer` binary with a `-pkg`
-        argument followed by a mandatory `-target /` and, if run in
-        verbose mode, one or more `-verbose*` flags.  We collapse the
-        target and verbose options into a single wildcarded token
-        (`-target*`) so that a single sudoers entry will match both
-        verbose and non‑verbose forms.  The package path has its
-        version directory wildcarded and its filename digit/hashes
-        replaced via `_wildcard_pkg_name`.  Any `-applyChoiceChangesXML`
-        argument has its filename replaced with a generic
-        `choices*.xml` to avoid embedding dates or random strings.
-        """
-        pkg_path_w: Optional[str] = None
-        xml_path_w: Optional[str] = None
-        other_flags: List[str] = []
-        i = 0
-        while i < len(args):
-            a = args[i]
-            if a == "-pkg" and i + 1 < len(args):
-                pkg_path = args[i + 1]
-                # Wildcard version directory in Caskroom path
-                if (
-                    isinstance(pkg_path, str)
-                    and pkg_path.startswith(brew_prefix)
-                    and "/Caskroom/" in pkg_path
-                ):
-                    parts = pkg_path.split("/")
-                    try:
-                        idx = parts.index("Caskroom")
-                        if idx + 2 < len(parts):
-                            parts[idx + 2] = "*"
-                        pkg_path = "/".join(parts)
-                    except ValueError:
-                        pass
-                # Separate directory and filename, wildcard filename version
-                pkg_dir, pkg_file = os.path.split(pkg_path)
-                pkg_file_w = _wildcard_pkg_name(pkg_file)
-                pkg_path_w = os.path.join(pkg_dir, pkg_file_w)
-                i += 2
-                continue
-            # Skip '-target' and its argument if present; also skip any
-            # subsequent '-verbose*' flags.
-            if a == "-target":
+    if not args:
+        return _normalize_log_other(cmd, args, user, brew_prefix)
+    new_args = list(args)
+    # Replace the last argument with a wildcarded path.
+    new_args[-1] = _wildcard_delete_path(new_args[-1])
+    return f"{user} ALL=(ALL) NOPASSWD: SETENV: " + join_command(cmd, new_args)
+
+
+def _normalize_log_installer(
+    cmd: str, args: List[str], user: str, brew_prefix: str
+) -> Optional[str]:
+    """
+    Normalise installer invocations from the logs.
+
+    Handles both /usr/sbin/installer and /usr/bin/installer variants
+    (basename == 'installer').  Homebrew invokes the macOS `installer`
+    binary with a `-pkg` argument followed by a mandatory `-target /`
+    and, if run in verbose mode, one or more `-verbose*` flags.  We
+    collapse the target and verbose options into a single wildcarded
+    token (`-target*`) so that a single sudoers entry will match both
+    verbose and non‑verbose forms.  This avoids generating separate
+    verbose and non‑verbose patterns and prevents the production of
+    multiple adjacent wildcard arguments.  The package path has its
+    version directory wildcarded and its filename digit/hashes
+    replaced via `_wildcard_pkg_name`.  Any `-applyChoiceChangesXML`
+    argument has its filename replaced with a generic
+    `choices*.xml` to avoid embedding dates or random strings.
+    """
+    if "-pkg" not in args:
+        return _normalize_log_other(cmd, args, user, brew_prefix)
+    pkg_path_w: Optional[str] = None
+    xml_path_w: Optional[str] = None
+    other_flags: List[str] = []
+    i = 0
+    while i < len(args):
+        a = args[i]
+        if a == "-pkg" and i + 1 < len(args):
+            pkg_path = args[i + 1]
+            # Wildcard version directory in Caskroom path
+            if (
+                isinstance(pkg_path, str)
+                and pkg_path.startswith(brew_prefix)
+                and "/Caskroom/" in pkg_path
+            ):
+                pkg_path = _wildcard_caskroom_version(pkg_path)
+            # Separate directory and filename, wildcard filename version
+            pkg_dir, pkg_file = os.path.split(pkg_path)
+            pkg_file_w = _wildcard_pkg_name(pkg_file)
+            pkg_path_w = os.path.join(pkg_dir, pkg_file_w)
+            i += 2
+            continue
+        # Skip '-target' and its argument if present; also skip any
+        # subsequent '-verbose*' flags.
+        if a == "-target":
+            i += 1
+            if i < len(args) and not args[i].startswith("-"):
                 i += 1
-                if i < len(args) and not args[i].startswith("-"):
-                    i += 1
-                while i < len(args) and args[i].startswith("-verbose"):
-                    i += 1
-                continue
-            # Replace applyChoiceChangesXML file with choices*.xml
-            if a == "-applyChoiceChangesXML" and i + 1 < len(args):
-                xml_path = args[i + 1]
-                try:
-                    xml_dir, xml_file = os.path.split(xml_path)
-                    if xml_file.startswith("choices"):
-                        xml_path_w = os.path.join(xml_dir, "choices*.xml")
-                    else:
-                        xml_path_w = os.path.join(xml_dir, "*.xml")
-                except Exception:
-                    xml_path_w = "/private/tmp/choices*.xml"
-                i += 2
-                continue
-            # Skip any standalone verbose flags
-            if a.startswith("-verbose"):
+            while i < len(args) and args[i].startswith("-verbose"):
                 i += 1
-                continue
-            # Preserve any other flags
-            other_flags.append(a)
+            continue
+        # Replace applyChoiceChangesXML file with choices*.xml
+        if a == "-applyChoiceChangesXML" and i + 1 < len(args):
+            xml_path = args[i + 1]
+            try:
+                xml_dir, xml_file = os.path.split(xml_path)
+                if xml_file.startswith("choices"):
+                    xml_path_w = os.path.join(xml_dir, "choices*.xml")
+                else:
+                    xml_path_w = os.path.join(xml_dir, "*.xml")
+            except Exception:
+                xml_path_w = "/private/tmp/choices*.xml"
+            i += 2
+            continue
+        # Skip any standalone verbose flags
+        if a.startswith("-verbose"):
             i += 1
-        if not pkg_path_w:
-            return None
-        # Build argument list: -pkg <path> + other flags + '-target*'
-        args_list: List[str] = []
-        args_list.extend(["-pkg", pkg_path_w])
-        args_list.extend(other_flags)
-        args_list.append("-target*")
-        # Append applyChoiceChangesXML if present
-        if xml_path_w:
-            args_list.extend(["-applyChoiceChangesXML", xml_path_w])
-        # Build a second variant that explicitly specifies '-target /' and
-        # allows any trailing arguments via a final '*'.  This improves
-        # compatibility with installers that pass '-target /' without
-        # additional flags.  We do not duplicate xml flags on this
-        # variant because they were already included in args_list above.
-        args_list2: List[str] = []
-        args_list2.extend(["-pkg", pkg_path_w])
-        args_list2.extend(other_flags)
-        args_list2.extend(["-target", "/"])
-        if xml_path_w:
-            args_list2.extend(["-applyChoiceChangesXML", xml_path_w])
-        # Compose the two rule lines.  The first uses '-target*' and
-        # join_command without trailing star; the second uses explicit
-        # '-target /' with allow_trailing_star=True.
-        line1 = f"{user} ALL=(ALL) NOPASSWD: SETENV: " + join_command(cmd, args_list)
-        line2 = f"{user} ALL=(ALL) NOPASSWD: SETENV: " + join_command(
-            cmd, args_list2, allow_trailing_star=True
-        )
-        return line1 + "\n" + line2
+            continue
+        # Preserve any other flags
+        other_flags.append(a)
+        i += 1
+    if not pkg_path_w:
+        return None
+    # Build argument list: -pkg <path> + other flags + '-target*'
+    args_list: List[str] = []
+    args_list.extend(["-pkg", pkg_path_w])
+    args_list.extend(other_flags)
+    args_list.append("-target*")
+    # Append applyChoiceChangesXML if present
+    if xml_path_w:
+        args_list.extend(["-applyChoiceChangesXML", xml_path_w])
+    # Build a second variant that explicitly specifies '-target /' and
+    # allows any trailing arguments via a final '*'.  This improves
+    # compatibility with installers that pass '-target /' without
+    # additional flags.  We do not duplicate xml flags on this
+    # variant because they were already included in args_list above.
+    args_list2: List[str] = []
+    args_list2.extend(["-pkg", pkg_path_w])
+    args_list2.extend(other_flags)
+    args_list2.extend(["-target", "/"])
+    if xml_path_w:
+        args_list2.extend(["-applyChoiceChangesXML", xml_path_w])
+    # Compose the two rule lines.  The first uses '-target*' and
+    # join_command without trailing star; the second uses explicit
+    # '-target /' with allow_trailing_star=True.
+    line1 = f"{user} ALL=(ALL) NOPASSWD: SETENV: " + join_command(cmd, args_list)
+    line2 = f"{user} ALL=(ALL) NOPASSWD: SETENV: " + join_command(
+        cmd, args_list2, allow_trailing_star=True
+    )
+    return line1 + "\n" + line2
+
+
+def _normalize_log_other(
+    cmd: str, args: List[str], user: str, brew_prefix: str
+) -> Optional[str]:
+    """Normalise Caskroom scripts, launchctl and any other command."""
     # Normalise arbitrary scripts under Caskroom with version directories
     if cmd.startswith(brew_prefix) and "/Caskroom/" in cmd:
-        parts = cmd.split("/")
-        try:
-            idx = parts.index("Caskroom")
-            if idx + 2 < len(parts):
-                parts[idx + 2] = "*"
-            cmd = "/".join(parts)
-        except ValueError:
-            pass
+        cmd = _wildcard_caskroom_version(cmd)
         return f"{user} ALL=(ALL) NOPASSWD: SETENV: " + join_command(
             cmd, args, allow_trailing_star=False
         )
     # Normalise launchctl list/remove from logs.  Handle both /bin/launchctl
     # and /usr/bin/launchctl variants (basename == 'launchctl').
-    if os.path.basename(cmd) == "launchctl" and args:
+    if cmd.rsplit("/", 1)[-1] == "launchctl" and args:
         action = args[0]
         label = args[1] if len(args) > 1 else ""
         # Use wildcard helpers to unify label
@@ -484,6 +656,73 @@ def _normalize_log_command(
     return f"{user} ALL=(ALL) NOPASSWD: SETENV: " + join_command(cmd, norm_args)
 
 
+@lru_cache(maxsize=256)
+def _resolve_cmd(cmd: str) -> Optional[str]:
+    """Resolve a bare command name to an absolute executable path.
+
+    Tries :func:`shutil.which` (honouring PATH) first, then scans common
+    system directories.  Returns None if nothing executable is found.
+    The same few commands recur on most log lines, so results are cached.
+    """
+    abs_cmd = shutil.which(cmd)
+    if abs_cmd:
+        return abs_cmd
+    # Fallback search in typical system directories.
+    for search_dir in ("/usr/bin", "/bin", "/usr/sbin", "/sbin"):
+        candidate = os.path.join(search_dir, cmd)
+        if os.path.exists(candidate) and os.access(candidate, os.X_OK):
+            return candidate
+    return None
+
+
+# Per‑command normalisers, keyed by the command's basename.  Commands not
+# listed here (including chown, whose owner:group is deliberately left
+# unchanged) go through _normalize_log_other.
+_LOG_COMMAND_HANDLERS = {
+    "cp": _normalize_log_cp,
+    "touch": _normalize_log_touch,
+    "rmdir": _normalize_log_rmdir,
+    "rm": _normalize_log_rm,
+    "installer": _normalize_log_installer,
+}
+
+
+def _normalize_log_command(
+    cmd: str, args: List[str], user: str, brew_prefix: str
+) -> Optional[str]:
+    """Return a sudoers rule for a log‑derived command.
+
+    Applies minimal wildcarding: leaves chown owner:group unchanged (no
+    wildcard '*:staff' on the user); wildcard version directories in
+    Caskroom paths; unify .app paths; wildcard deletion targets;
+    handle common installer/cp/touch patterns.
+
+    Before performing any normalisation, resolve bare command names to
+    absolute paths.  The reinstall logs sometimes record commands like
+    ``rm`` or ``touch`` without a leading slash.  Sudoers requires
+    absolute paths, so we attempt to resolve such bare commands using
+    :func:`shutil.which` and a fallback search in common system
+    directories.  If the command cannot be resolved to an existing
+    executable, the log line is ignored (returns ``None``).
+    """
+    # Ensure bare command names are resolved to absolute paths.
+    if cmd and not cmd.startswith("/"):
+        abs_cmd = _resolve_cmd(cmd)
+        if not abs_cmd:
+            # Unresolvable command; skip creating a rule.
+            return None
+        cmd = abs_cmd
+    # Skip obvious noise or empty commands.  Some log lines contain messages
+    # enclosed in backticks or have no real command; ignore those.
+    if not cmd or "`" in cmd:
+        return None
+    # Dispatch on the basename once.  chown is intentionally not
+    # special‑cased: its owner:group is retained as logged so that no
+    # wildcard chown rules (e.g. '*:staff') are generated.
+    handler = _LOG_COMMAND_HANDLERS.get(cmd.rsplit("/", 1)[-1], _normalize_log_other)
+    return handler(cmd, args, user, brew_prefix)
+
+
 def process_log_file(log_path: str, user: str, brew_prefix: str) -> List[str]:
     """Return sudoers rule lines parsed from a brew install log.
 
@@ -492,44 +731,36 @@ def process_log_file(log_path: str, user: str, brew_prefix: str) -> List[str]:
     ignores lines with Ruby object dumps.  Applies wildcarding via
     `_normalize_log_command`.
     """
-    rules = []
-    seen = set()
+    # Insertion‑ordered set of rules: a dict does the membership test and
+    # the ordered storage with a single hash lookup per rule.
+    rules: Dict[str, None] = {}
+    # Commands already normalised; repeated sudo invocations yield the same
+    # rules, so skip them before the (regex heavy) normalisation step.
+    seen_cmds = set()
     try:
         with open(log_path, "r", encoding="utf-8", errors="ignore") as fh:
             for raw in fh:
                 if "/usr/bin/sudo" not in raw:
                     continue
-                # Skip descriptive messages
-                if (
-                    "with `sudo`" in raw
-                    or "Uninstalling packages" in raw
-                    or "Changing ownership" in raw
-                ):
-                    continue
-                if "Running installer" in raw:
-                    continue
-                # Skip Ruby object dumps and other Ruby inspector outputs
-                if (
-                    "#<Cask" in raw
-                    or "Cask::" in raw
-                    or "@dsl_args" in raw
-                    or "@directives" in raw
-                    or "@cask=" in raw
-                ):
+                # Skip descriptive messages and Ruby object dumps
+                if LOG_NOISE_RE.search(raw):
                     continue
                 # Skip sudo error/warning lines (e.g. "sudo: 3 incorrect password attempts")
-                stripped = raw.strip()
-                if stripped.startswith("sudo:"):
+                if raw.lstrip().startswith("sudo:"):
                     continue
                 # Tokenise
                 try:
-                    tokens = shlex.split(raw, posix=True)
+                    tokens = _split_log_line(raw)
                 except Exception:
                     continue
                 parsed = _find_log_command_tokens(tokens)
                 if not parsed:
                     continue
                 cmd, args = parsed
+                key = (cmd, tuple(args))
+                if key in seen_cmds:
+                    continue
+                seen_cmds.add(key)
                 # Generate rule(s)
                 rule = _normalize_log_command(cmd, args, user, brew_prefix)
                 if not rule:
@@ -541,15 +772,15 @@ def process_log_file(log_path: str, user: str, brew_prefix: str) -> List[str]:
                     # which would require password prompts again on upgrades.  By
                     # wildcarding here we unify those numeric segments across the
                     # whole rule string.  This call is idempotent for strings
-                    # already wildcarded by earlier helpers.
-                    r = _wildcard_versions_in_rule(r)
-                    if r not in seen:
-                        rules.append(r)
-                        seen.add(r)
+                    # already wildcarded by earlier helpers, and skipped for
+                    # rules it would leave unchanged.
+                    if RULE_VERSION_HINT_RE.search(r):
+                        r = _wildcard_versions_in_rule(r)
+                    rules[r] = None
     except Exception:
         # If log file missing or unreadable, return empty
         return []
-    return rules
+    return list(rules)
 
 
 def process_log_file_by_cask(
@@ -580,8 +811,10 @@ def process_log_file_by_cask(
         A dictionary mapping cask tokens (or ``None`` for global rules)
         to lists of sudoers rule strings derived from the log.
     """
-    mapping: Dict[Optional[str], List[str]] = {}
-    seen: Dict[Optional[str], set] = {}
+    # Per‑cask insertion‑ordered sets of rules (see process_log_file)
+    mapping: Dict[Optional[str], Dict[str, None]] = {}
+    # (cask, cmd, args) tuples already normalised; see process_log_file.
+    seen_cmds = set()
     current_cask: Optional[str] = None
     try:
         with open(log_path, "r", encoding="utf-8", errors="ignore") as fh:
@@ -599,44 +832,36 @@ def process_log_file_by_cask(
                 if "/usr/bin/sudo" not in raw:
                     continue
                 # Skip descriptive and Ruby lines
-                if (
-                    "with `sudo`" in raw
-                    or "Uninstalling packages" in raw
-                    or "Changing ownership" in raw
-                    or "Running installer" in raw
-                    or "#<Cask" in raw
-                    or "Cask::" in raw
-                    or "@dsl_args" in raw
-                    or "@directives" in raw
-                    or "@cask=" in raw
-                ):
+                if LOG_NOISE_RE.search(raw):
                     continue
-                stripped = raw.strip()
-                if stripped.startswith("sudo:"):
+                if line.startswith("sudo:"):
                     continue
                 try:
-                    tokens = shlex.split(raw, posix=True)
+                    tokens = _split_log_line(raw)
                 except Exception:
                     continue
                 parsed = _find_log_command_tokens(tokens)
                 if not parsed:
                     continue
                 cmd, args = parsed
+                key = (current_cask, cmd, tuple(args))
+                if key in seen_cmds:
+                    continue
+                seen_cmds.add(key)
                 rule = _normalize_log_command(cmd, args, user, brew_prefix)
                 if not rule:
                     continue
                 for r in rule.split("\n"):
                     # Wildcard version numbers
-                    r = _wildcard_versions_in_rule(r)
-                    if current_cask not in mapping:
-                        mapping[current_cask] = []
-                        seen[current_cask] = set()
-                    if r not in seen[current_cask]:
-                        mapping[current_cask].append(r)
-                        seen[current_cask].add(r)
+                    if RULE_VERSION_HINT_RE.search(r):
+                        r = _wildcard_versions_in_rule(r)
+                    mapping.setdefault(current_cask, {})[r] = None
     except Exception:
         return {}
-    return mapping
+    return {tok: list(rules) for tok, rules in mapping.items()}
+
+
+APPDIR_RE = re.compile(r"^(?:\$APPDIR|#\{appdir\})/(?P<dir>[^/]+)")
 
 
 def determine_dest_dir(uninst: Dict[str, List[Any]]) -> Optional[str]:
@@ -645,20 +870,54 @@ def determine_dest_dir(uninst: Dict[str, List[Any]]) -> Optional[str]:
     Some casks specify `$APPDIR` or `#{appdir}` in their uninstall `trash`
     or `delete` directives.  Replace these with `/Applications/<dir>`.
     """
-    pattern = re.compile(r"^(?:\$APPDIR|#\{appdir\})/(?P<dir>[^/]+)")
     for key in ("trash", "delete"):
         for path in uninst.get(key, []):
-            m = pattern.match(str(path))
+            m = APPDIR_RE.match(str(path))
             if m:
-                return os.path.join("/Applications", m.group("dir"))
+                return f"/Applications/{m.group('dir')}"
     return None
 
 
 ###############################################################################
 # Wildcard helper functions
+#
+# These helpers are pure str -> str transforms.  The same paths recur many
+# times (every Caskroom path is seen on install, overwrite, chown and
+# remove), so the expensive ones are memoised with lru_cache.
 
 TEAM_ID_RE = re.compile(r"^[A-Z0-9]{8,12}$")
 
+# Patterns used by the path wildcarding helpers.  These run once per path
+# segment, so they are compiled here rather than on every call.
+NUMERIC_SEGMENT_RE = re.compile(r"[\d.,_-]+")
+DOTTED_NUMBER_RE = re.compile(r"[\d.,]+")
+# Alternation of the three digit-run substitutions applied to each segment.
+# The alternatives never overlap, so one scan gives the same result as
+# running them one after another.
+SEGMENT_DIGITS_RE = re.compile(
+    r"(?:\s|-|_)\d+[\d.,]*"  # digits after space/hyphen/underscore
+    r"|[A-Za-z]\d+(?:[\d.,]*$|(?=[A-Z]))"  # trailing, or before uppercase
+)
+TRAILING_DIGITS_RE = re.compile(r"([A-Za-z])\d+(?:[\d.,]*)$")
+V_VERSION_RE = re.compile(r"v\d+(?:[\d.]+)*")
+UPPER_ALNUM_RE = re.compile(r"[A-Z0-9]+")
+UPPER_ALNUM_STAR_RE = re.compile(r"[A-Z0-9\*]+")
+APP_SEP_VERSION_RE = re.compile(r"(?:\s|\-|_)(?:v?\d+(?:[\d.]+)*)$")
+APP_TRAILING_VERSION_RE = re.compile(r"(.*?)(\d+(?:[\d.]+)*)$")
+
+
+def _collapse_stars(s: str, unit: str = "*") -> str:
+    """Collapse runs of `unit` (by default '*') into a single copy.
+
+    Equivalent to ``re.sub(r"(?:<unit>)+", unit, s)`` but done with
+    str.replace, which is much cheaper for the common case of a string
+    that has no runs at all.  Also used with '-*' and '_*'.
+    """
+    double = unit + unit
+    while double in s:
+        s = s.replace(double, unit)
+    return s
+
 
 def _wildcard_team_id(segment: str) -> str:
     """Replace developer team ID segments with a wildcard.
@@ -674,6 +933,7 @@ def _wildcard_team_id(segment: str) -> str:
     return prefix + ("*" if TEAM_ID_RE.match(segment) else segment)
 
 
+@lru_cache(maxsize=8192)
 def _wildcard_delete_path(path: str) -> str:
     """Wildcard variable portions in deletion paths.
 
@@ -704,42 +964,37 @@ def _wildcard_delete_path(path: str) -> str:
         # merely start with a digit but also contain letters (e.g. '115Browser.app').  This
         # avoids dangerous patterns like '/Applications/*.app' while still wildcarding
         # purely numeric or version‑like directory names (e.g. '13.6.3,24585314_0521' -> '*').
-        if re.fullmatch(r"[\d.,_-]+", seg):
+        if NUMERIC_SEGMENT_RE.fullmatch(seg):
             seg = "*"
         # Replace segments like '13.6.3,24585314_0521' entirely (orig may include
         # characters stripped by team ID processing above).
-        if re.fullmatch(r"[\d.,_-]+", orig):
+        if NUMERIC_SEGMENT_RE.fullmatch(orig):
             seg = "*"
-        # Replace digits preceded by space/hyphen/underscore
-        seg = re.sub(
-            r"(?:\s|-|_)(?:\d+)(?:[\d.,]*)", lambda m: m.group(0)[0] + "*", seg
-        )
-        # Replace trailing digits after letters (e.g. 'macgpg2' -> 'macgpg*')
-        seg = re.sub(r"([A-Za-z])\d+(?:[\d.,]*)$", r"\1*", seg)
-
-        # Replace digits preceding an uppercase letter within the segment.  This
-        # helps generalise names like 'Folx3Plugin' -> 'Folx*Plugin'.  We look
-        # for digits following a letter and immediately before an uppercase
-        # letter, and replace the digit sequence with '*'.
-        seg = re.sub(r"([A-Za-z])\d+(?=[A-Z])", r"\1*", seg)
+        # Replace digit runs in a single scan, keeping the character that
+        # introduces each run:
+        #   - digits preceded by space/hyphen/underscore ('Folx-3' -> 'Folx-*')
+        #   - trailing digits after letters (e.g. 'macgpg2' -> 'macgpg*')
+        #   - digits after a letter and before an uppercase letter
+        #     (e.g. 'Folx3Plugin' -> 'Folx*Plugin')
+        seg = SEGMENT_DIGITS_RE.sub(lambda m: m.group(0)[0] + "*", seg)
 
         # If segment contains an extension (e.g. 'com.techsmith.camtasia25.sfl'),
         # wildcard digits immediately before the final dot.  This allows
         # version numbers embedded in filenames to be generalised.  We treat
         # only the last component before the extension to avoid affecting
         # domain prefixes.
-        if "." in seg and not re.fullmatch(r"[\d.,]+", seg):
+        if "." in seg and not DOTTED_NUMBER_RE.fullmatch(seg):
             # Split on the last dot into name and extension
             base, dot, ext = seg.rpartition(".")
             if base:
                 # If base ends with digits preceded by a letter, wildcard them
-                new_base = re.sub(r"([A-Za-z])\d+(?:[\d.,]*)$", r"\1*", base)
+                new_base = TRAILING_DIGITS_RE.sub(r"\1*", base)
                 if new_base != base:
                     seg = new_base + dot + ext
         # Replace v‑prefixed versions
-        seg = re.sub(r"v\d+(?:[\d.]+)*", "v*", seg)
+        seg = V_VERSION_RE.sub("v*", seg)
         # Collapse multiple stars within the segment
-        seg = re.sub(r"\*+", "*", seg)
+        seg = _collapse_stars(seg)
         # Collapse team identifier segments containing stars.  Two cases:
         # (1) If the segment consists solely of uppercase letters/digits with
         #     embedded stars and no other punctuation (e.g. '7SFX*GNR7'),
@@ -758,8 +1013,8 @@ def _wildcard_delete_path(path: str) -> str:
                 clean_pre = pre.replace("*", "")
                 if (
                     len(clean_pre) >= 6
-                    and re.fullmatch(r"[A-Z0-9]+", clean_pre)
-                    and re.fullmatch(r"[A-Z0-9\*]+", pre)
+                    and UPPER_ALNUM_RE.fullmatch(clean_pre)
+                    and UPPER_ALNUM_STAR_RE.fullmatch(pre)
                 ):
                     seg = "*" + dot + suf
                 else:
@@ -767,22 +1022,23 @@ def _wildcard_delete_path(path: str) -> str:
                     clean = orig.replace("*", "")
                     if (
                         len(clean) >= 6
-                        and re.fullmatch(r"[A-Z0-9]+", clean)
-                        and re.fullmatch(r"[A-Z0-9\*]+", seg)
+                        and UPPER_ALNUM_RE.fullmatch(clean)
+                        and UPPER_ALNUM_STAR_RE.fullmatch(seg)
                     ):
                         seg = "*"
             else:
                 clean = orig.replace("*", "")
                 if (
                     len(clean) >= 6
-                    and re.fullmatch(r"[A-Z0-9]+", clean)
-                    and re.fullmatch(r"[A-Z0-9\*]+", seg)
+                    and UPPER_ALNUM_RE.fullmatch(clean)
+                    and UPPER_ALNUM_STAR_RE.fullmatch(seg)
                 ):
                     seg = "*"
         parts.append(seg)
     return "/".join(parts)
 
 
+@lru_cache(maxsize=8192)
 def _wildcard_app_path(path: str) -> str:
     """Wildcard version numbers in `.app` paths.
 
@@ -797,17 +1053,27 @@ def _wildcard_app_path(path: str) -> str:
         if seg.endswith(".app"):
             base = seg[:-4]
             # e.g. 'SMS Plus v1.3.7' -> 'SMS Plus v*'
-            base = re.sub(
-                r"(?:\s|\-|_)(?:v?\d+(?:[\d.]+)*)$", lambda m: m.group(0)[0] + "*", base
-            )
+            base = APP_SEP_VERSION_RE.sub(lambda m: m.group(0)[0] + "*", base)
             # e.g. 'Folx3' -> 'Folx*'
-            base = re.sub(r"(.*?)(\d+(?:[\d.]+)*)$", r"\1*", base)
+            base = APP_TRAILING_VERSION_RE.sub(r"\1*", base)
             seg = base + ".app"
         seg = _wildcard_delete_path(seg)
         new_segments.append(seg)
     return "/".join(new_segments)
 
 
+# Patterns for the installer package, script and pkgutil ID helpers below.
+PAREN_DIGITS_RE = re.compile(r"\(\d+\)")
+PKG_SEP_DIGITS_RE = re.compile(r"([_-])\d[\d._,]*")
+SCRIPT_SEP_DIGITS_RE = re.compile(r"([_-])\d[\d._]*")
+SCRIPT_V_DIGITS_RE = re.compile(r"v\d[\d.]*")
+HYPHEN_STAR_RUN_RE = re.compile(r"(?:-_*\*)+")
+UNDERSCORE_STAR_RUN_RE = re.compile(r"(?:__\*)+")
+TRAILING_DIGITS_ONLY_RE = re.compile(r"\d+$")
+DIGIT_RE = re.compile(r"\d")
+
+
+@lru_cache(maxsize=8192)
 def _wildcard_pkg_name(pkg: str) -> str:
     """Wildcard version numbers in package (.pkg) filenames.
 
@@ -816,17 +1082,22 @@ def _wildcard_pkg_name(pkg: str) -> str:
     'mactex-basictex-20250308.pkg' -> 'mactex-basictex-*.pkg'.  Also
     collapses multiple '*-'.
     """
+    # Every pass needs a digit or an existing '*' to match; most names
+    # without either (e.g. 'GoogleChrome.pkg') come back unchanged.
+    if "*" not in pkg and not DIGIT_RE.search(pkg):
+        return pkg
     # Replace parenthesised numeric sequences, e.g. '(5558)', with '*'
-    name = re.sub(r"\(\d+\)", "*", pkg)
-    name = re.sub(r"([_-])\d[\d._,]*", r"\1*", name)
+    name = PAREN_DIGITS_RE.sub("*", pkg)
+    name = PKG_SEP_DIGITS_RE.sub(r"\1*", name)
     # Collapse repeated -* or _*
-    name = re.sub(r"(?:-_*\*)+", "-*", name)
-    name = re.sub(r"(?:__\*)+", "_*", name)
+    name = HYPHEN_STAR_RUN_RE.sub("-*", name)
+    name = UNDERSCORE_STAR_RUN_RE.sub("_*", name)
     # Collapse consecutive stars into a single star
-    name = re.sub(r"\*+", "*", name)
+    name = _collapse_stars(name)
     return name
 
 
+@lru_cache(maxsize=8192)
 def _wildcard_script_name(script: str) -> str:
     """Wildcard numeric segments in script executables.
 
@@ -836,17 +1107,21 @@ def _wildcard_script_name(script: str) -> str:
     becomes 'Anaconda*-*-MacOSX-arm64.sh'.  Collapses repeated '-*'
     segments.
     """
-    s = re.sub(r"([_-])\d[\d._]*", r"\1*", script)
+    # As for package names, there is nothing to do without a digit or '*'
+    if "*" not in script and not DIGIT_RE.search(script):
+        return script
+    s = SCRIPT_SEP_DIGITS_RE.sub(r"\1*", script)
     # Replace sequences of v + digits
-    s = re.sub(r"v\d[\d.]*", "v*", s)
+    s = SCRIPT_V_DIGITS_RE.sub("v*", s)
     # Collapse repeated -* or _*
-    s = re.sub(r"(?:-_*\*)+", "-*", s)
-    s = re.sub(r"(?:__\*)+", "_*", s)
+    s = HYPHEN_STAR_RUN_RE.sub("-*", s)
+    s = UNDERSCORE_STAR_RUN_RE.sub("_*", s)
     # Collapse consecutive stars to a single star
-    s = re.sub(r"\*+", "*", s)
+    s = _collapse_stars(s)
     return s
 
 
+@lru_cache(maxsize=8192)
 def _wildcard_pkgutil_id(pid: str) -> str:
     """Wildcard trailing numeric version in pkgutil IDs.
 
@@ -854,7 +1129,7 @@ def _wildcard_pkgutil_id(pid: str) -> str:
     replace the digits with '*'.  e.g. 'org.tug.mactex.basictex2025'
     -> 'org.tug.mactex.basictex*'.
     """
-    return re.sub(r"\d+$", "*", pid)
+    return TRAILING_DIGITS_ONLY_RE.sub("*", pid)
 
 
 # -----------------------------------------------------------------------------
@@ -866,80 +1141,71 @@ def _wildcard_pkgutil_id(pid: str) -> str:
 # version numbers can cause sudoers rules to break when the underlying
 # application is updated.  The `_wildcard_versions_in_rule` helper
 # performs conservative text substitutions on an entire rule to replace
-# version‑like tokens with wildcards.
-
-
-def _wildcard_versions_in_rule(rule: str) -> str:
-    """Replace version identifiers in a sudoers rule with wildcards.
+# version‑like tokens with wildcards.  The substitutions are listed below
+# as precompiled (pattern, replacement, digitless) entries and applied in
+# order.  `digitless` is None for passes that need a digit to match; for the
+# passes that can match a rule containing no digit at all it is a regex
+# source that finds every place where the pass would change such a rule.
+# Keep it accurate when adding or editing a pass.
 
-    Parameters
-    ----------
-    rule : str
-        A single sudoers rule line of the form ``user ALL=(ALL) NOPASSWD: SETENV: …``.
 
-    Returns
-    -------
-    str
-        The rule with variable version components replaced by '*'.
-    """
+RULE_VERSION_PASSES = [
     # Replace version directories in Caskroom paths (e.g.
     # /Caskroom/foo/1.2.3 -> /Caskroom/foo/*).  Only the immediate
     # subdirectory after <cask> is wildcarded.
-    rule = re.sub(r"(/Caskroom/[^/]+/)[^/]+", r"\1*", rule)
+    (re.compile(r"(/Caskroom/[^/]+/)[^/]+"), r"\1*", r"/Caskroom/"),
     # Replace sequences of numbers separated by punctuation characters such
     # as ., -, _, , or parentheses with a single '*'.  We require at
     # least one separator to avoid matching simple integers.  Examples:
     # 1.2.3, 6.0.4-1234, 2_5_0, 3_7_1(5558) -> *.
-    rule = re.sub(r"\b\d+[\.\-_,()]\d+(?:[\.\-_,()]\d+)*\b", "*", rule)
+    (re.compile(r"\b\d+[\.\-_,()]\d+(?:[\.\-_,()]\d+)*\b"), "*", None),
     # Replace version numbers that appear after a dot without a preceding
     # letter (e.g. '.2025', '.0.20.1').  This helps wildcard API
     # identifiers or bundle names like 'LayOut.2025.LayOutThumbnailExtension'.
-    rule = re.sub(r"\.\d+(?:[\.\-_,]\d+)*", ".*", rule)
+    (re.compile(r"\.\d+(?:[\.\-_,]\d+)*"), ".*", None),
     # Replace standalone eight‑digit sequences (often dates) with '*'
-    rule = re.sub(r"\b\d{8}\b", "*", rule)
+    (re.compile(r"\b\d{8}\b"), "*", None),
     # Replace four‑digit sequences when preceded by a letter, dot, underscore
     # or hyphen.  This catches year‑like segments such as '.2025' or '_2024'.
-    rule = re.sub(r"(?<=[A-Za-z._-])\d{4}\b", "*", rule)
-    # Replace macOS SDK suffixes like 'macosx26' or 'macos10' with a wildcard.
-    rule = re.sub(r"macosx\d+", "macosx*", rule)
-    rule = re.sub(r"macos\d+", "macos*", rule)
-    # Replace architecture targets like 'arm64' with 'arm*' to allow
-    # future CPU variations (e.g. arm65).  Only collapse the numeric
-    # portion after 'arm'.
-    rule = re.sub(r"arm\d+", "arm*", rule)
+    (re.compile(r"(?<=[A-Za-z._-])\d{4}\b"), "*", None),
+    # Replace macOS SDK suffixes like 'macosx26' or 'macos10' with a wildcard,
+    # and architecture targets like 'arm64' with 'arm*' to allow future CPU
+    # variations (e.g. arm65).  Only the numeric portion is collapsed.  The
+    # three prefixes cannot overlap, so one alternation does the work of
+    # separate passes.
+    (re.compile(r"(macosx?|arm)\d+"), r"\1*", None),
     # Replace occurrences of 'v' followed by digits (e.g. v2, v10) with 'v*'.
-    rule = re.sub(r"\bv\d+\b", "v*", rule)
+    (re.compile(r"\bv\d+\b"), "v*", None),
     # Replace hyphen‑prefixed dotted version numbers like '-1.0' or '-3.4.5'
     # with '-*'.  This captures minor or patch versions embedded in
     # launchctl labels and other identifiers (e.g. 'com.adobe.AAM.Startup-1.0').
-    rule = re.sub(r"-(?:\d+\.)+\d+", "-*", rule)
+    (re.compile(r"-(?:\d+\.)+\d+"), "-*", None),
     # Replace single‑digit ordinals (e.g. '3rd', '1st', '2nd', '4th') with '*'.
-    rule = re.sub(r"\d+(?:st|nd|rd|th)", "*", rule)
-    # Replace digits preceded by a letter and followed by a dot or hyphen.  This
-    # handles cases like 'net9.Welly' -> 'net*.Welly' and 'foo3-bar' -> 'foo*-bar'.
-    rule = re.sub(r"(?<=[A-Za-z])\d+(?=[\.\-])", "*", rule)
-    # Replace digits preceded by a letter and followed by another letter.  This
-    # handles CamelCase or concatenated identifiers such as 'numi3helper' and
-    # 'BlueHarvestHelper8' by wildcarding the numeric component.  It will
-    # transform them to 'numi*helper' and 'BlueHarvestHelper*'.
-    rule = re.sub(r"([A-Za-z])\d+(?=[A-Za-z])", r"\1*", rule)
-    # Replace digits preceded by a letter at the end of a word (not followed
-    # by another alphanumeric character).  This covers patterns like
-    # 'BlueHarvestHelper8' -> 'BlueHarvestHelper*' and 'numi3' -> 'numi*'.
-    rule = re.sub(r"([A-Za-z])\d+(?=[^A-Za-z0-9]|$)", r"\1*", rule)
+    (re.compile(r"\d+(?:st|nd|rd|th)"), "*", None),
+    # Replace a run of digits preceded by a letter, whatever follows it: a
+    # dot or hyphen ('net9.Welly' -> 'net*.Welly', 'foo3-bar' -> 'foo*-bar'),
+    # another letter ('numi3helper' -> 'numi*helper') or the end of a word
+    # ('BlueHarvestHelper8' -> 'BlueHarvestHelper*').  These used to be three
+    # passes with different lookaheads; since the run is always taken up to
+    # the next non-digit, together they cover every such run.
+    (re.compile(r"(?<=[A-Za-z])\d+"), "*", None),
     # Replace long hexadecimal or alphanumeric tokens (8+ characters) that
-    # resemble commit hashes or unique identifiers with '*'.
-    rule = re.sub(r"\b[0-9a-fA-F]{8,}\b", "*", rule)
+    # resemble commit hashes or unique identifiers with '*'.  Like the other
+    # character-class passes here this stays a regex: a hand-written
+    # per-character scanner in Python is several times slower than the
+    # regex engine's C loop on rule-length strings.
+    (re.compile(r"\b[0-9a-fA-F]{8,}\b"), "*", r"\b[0-9a-fA-F]{8,}\b"),
     # Replace hyphen‑prefixed alphanumeric fragments of 5 or more characters
     # that include at least one digit (e.g. '-5b3ous', '-cc24aef4') with
     # '-*'.  This helps wildcard variable suffixes in filenames like
     # 'choices20250918-92814-5b3ous.xml' without matching normal
     # hyphenated words such as '-teams'.
-    rule = re.sub(r"-(?=[0-9A-Za-z]*\d)[0-9A-Za-z]{5,}", "-*", rule)
+    (re.compile(r"-(?=[0-9A-Za-z]*\d)[0-9A-Za-z]{5,}"), "-*", None),
     # Collapse repeated '-*' patterns into a single '-*'
-    rule = re.sub(r"(?:-\*){2,}", "-*", rule)
-    # Collapse consecutive stars into a single star
-    rule = re.sub(r"\*+", "*", rule)
+    (re.compile(r"(?:-\*){2,}"), "-*", r"-\*-\*"),
+    # Collapse consecutive stars into a single star (a lone star is left as
+    # it is, so only a run of two counts as a change)
+    (re.compile(r"\*+"), "*", r"\*\*"),
     # Replace numeric sequences separated by dots or underscores that are
     # embedded within alphanumeric tokens.  For example, convert
     # 'iMazing3.4.0.23220Mac' -> 'iMazing*Mac' and
@@ -948,28 +1214,78 @@ def _wildcard_versions_in_rule(rule: str) -> str:
     # (dot or underscore) plus additional digits, and require that it be
     # immediately preceded by a letter.  This avoids matching IP
     # addresses or plain numeric segments already handled above.
-    rule = re.sub(r"(?<=[A-Za-z])\d+(?:[._]\d+)+", "*", rule)
+    (re.compile(r"(?<=[A-Za-z])\d+(?:[._]\d+)+"), "*", None),
     # Replace parenthesised numeric or version sequences like '(5558)' or
     # '(1.2.3)' with a single '*'.  This helps generalise installer
     # package names that embed build numbers.
-    rule = re.sub(r"\(\d+(?:[\d._]*?)\)", "*", rule)
+    (re.compile(r"\(\d+(?:[\d._]*?)\)"), "*", None),
     # Collapse ARMDCHelper cc suffixes: if a label contains '.cc' followed
     # by a long sequence of hex digits (optionally interspersed with
     # previously inserted stars), replace the entire suffix after '.cc'
     # with a single '*'.  This handles log entries where the hash has
     # already been partially wildcarded (e.g. 'cc*aef*a*b*ed...').
-    rule = re.sub(r"(\.cc)(?:[0-9A-Fa-f\*]{8,})", r"\1*", rule)
+    (re.compile(r"(\.cc)(?:[0-9A-Fa-f\*]{8,})"), r"\1*", r"\.cc[0-9A-Fa-f*]{8,}"),
+]
+
+# The (pattern, replacement) pairs applied to every rule, and the subset
+# marked above as able to match a rule without any digits.  Every other
+# pass needs at least one \d, and no replacement introduces digits, so a
+# digit-free rule only has to go through these.
+RULE_VERSION_SUBS = [(pattern, repl) for pattern, repl, _ in RULE_VERSION_PASSES]
+RULE_DIGITLESS_SUBS = [
+    (pattern, repl)
+    for pattern, repl, digitless in RULE_VERSION_PASSES
+    if digitless is not None
+]
+
+# Anything `_wildcard_versions_in_rule` could rewrite in a rule: a digit
+# (every other pass needs one), a match for one of the digitless hints in
+# the table, or a '_*' run for the collapse step after it ('-*' and '*'
+# runs are already covered by the table's collapse passes).
+# Rules that match none of these, such as the constant touch rules, come
+# back unchanged and can skip it.
+RULE_VERSION_HINT_RE = re.compile(
+    "|".join(
+        [r"\d"]
+        + [digitless for _, _, digitless in RULE_VERSION_PASSES if digitless]
+        + [r"_\*_\*"]
+    )
+)
+
+
+@lru_cache(maxsize=8192)
+def _wildcard_versions_in_rule(rule: str) -> str:
+    """Replace version identifiers in a sudoers rule with wildcards.
+
+    Parameters
+    ----------
+    rule : str
+        A single sudoers rule line of the form ``user ALL=(ALL) NOPASSWD: SETENV: …``.
+
+    Returns
+    -------
+    str
+        The rule with variable version components replaced by '*'.
+    """
+    subs = RULE_VERSION_SUBS if DIGIT_RE.search(rule) else RULE_DIGITLESS_SUBS
+    for pattern, repl in subs:
+        rule = pattern.sub(repl, rule)
     # Collapse multiple '-*' or '_*' patterns that may have been
-    # introduced by the substitutions above.  Ensure we don't end up with
-    # '-*-*' or similar.
-    rule = re.sub(r"(?:-\*){2,}", "-*", rule)
-    rule = re.sub(r"(?:_\*){2,}", "_*", rule)
-    # Collapse remaining consecutive stars once more
-    rule = re.sub(r"\*+", "*", rule)
-    return rule
+    # introduced by the substitutions above, so we don't end up with
+    # '-*-*' or similar, then any remaining consecutive stars.
+    rule = _collapse_stars(rule, "-*")
+    rule = _collapse_stars(rule, "_*")
+    return _collapse_stars(rule)
+
+
+# Version-like suffixes of launchctl labels, tried in this order.
+LAUNCHCTL_HASH_RE = re.compile(r"\.[a-f0-9]{8,}$")
+LAUNCHCTL_VERSION_RE = re.compile(r"([\.-])v?\d(?:[\d.]+)*$")
+LAUNCHCTL_DIGITS_RE = re.compile(r"([A-Za-z])\d+$")
 
 
-def _wildcard_launchctl_labels(label: str) -> List[str]:
+@lru_cache(maxsize=8192)
+def _wildcard_launchctl_labels(label: str) -> Tuple[str, ...]:
     """Generate wildcarded variants of a launchctl label.
 
     This helper produces additional patterns to match launchctl labels
@@ -989,7 +1305,8 @@ def _wildcard_launchctl_labels(label: str) -> List[str]:
         label: The original launchctl label from the cask.
 
     Returns:
-        A list of wildcarded label strings.  May be empty.
+        A tuple of wildcarded label strings.  May be empty.  The result is
+        cached, so it is returned as a tuple rather than a list.
     """
     variants: List[str] = []
     # Special handling: if the label contains a '.helper' component (e.g.
@@ -1002,15 +1319,18 @@ def _wildcard_launchctl_labels(label: str) -> List[str]:
             variants.append(f"{helper_base}.*")
 
     wild = None
+    # Each suffix can only match once, so the match found is spliced out
+    # directly rather than searched for again by re.sub.
     # Hash‑like suffix
-    if re.search(r"\.[a-f0-9]{8,}$", label):
-        wild = re.sub(r"\.[a-f0-9]{8,}$", ".*", label)
-    # Hyphen or dot followed by version digits
-    elif re.search(r"[\.-]v?\d(?:[\d.]+)*$", label):
-        wild = re.sub(r"([\.-])v?\d(?:[\d.]+)*$", r"\1*", label)
-    # Embedded digit at end of component
-    elif re.search(r"[A-Za-z]\d+$", label):
-        wild = re.sub(r"([A-Za-z])\d+$", r"\1*", label)
+    m = LAUNCHCTL_HASH_RE.search(label)
+    if m:
+        wild = f"{label[: m.start()]}.*{label[m.end() :]}"
+    else:
+        # Hyphen or dot followed by version digits, or failing that an
+        # embedded digit at end of component; keep the separator/letter.
+        m = LAUNCHCTL_VERSION_RE.search(label) or LAUNCHCTL_DIGITS_RE.search(label)
+        if m:
+            wild = f"{label[: m.start()]}{m.group(1)}*{label[m.end() :]}"
     if wild and wild != label:
         variants.append(wild)
     # Always include an application installer variant; if a wildcard label was
@@ -1020,10 +1340,11 @@ def _wildcard_launchctl_labels(label: str) -> List[str]:
     if label.startswith("com."):
         base_for_app = wild if wild else label
         variants.append(f"application.{base_for_app}.installer*")
-    return variants
+    return tuple(variants)
 
 
-def _wildcard_cask_path(path: str, token: str) -> str:
+@lru_cache(maxsize=8192)
+def _wildcard_cask_path(path: str, token: str, brew_prefix: str) -> str:
     """Wildcard the version portion of a Caskroom path.
 
     Given a path like
@@ -1031,23 +1352,268 @@ def _wildcard_cask_path(path: str, token: str) -> str:
     return a path that replaces the version directory with '*':
       /opt/homebrew/Caskroom/chatgpt/*/ChatGPT.app
     Also applies `_wildcard_delete_path` to the remaining segments.
+    `brew_prefix` is the Homebrew prefix the caller already resolved.
     """
-    prefix = os.path.join(run(["brew", "--prefix"]), "Caskroom", token)
+    prefix = f"{brew_prefix}/Caskroom/{token}"
     if path.startswith(prefix):
         suffix = path[len(prefix) :].lstrip("/")
         parts = suffix.split("/")
         if parts:
             parts[0] = "*"
         suffix_w = "/".join(parts)
-        out = os.path.join(prefix, suffix_w)
+        out = f"{prefix}/{suffix_w}"
     else:
         out = path
     return _wildcard_delete_path(out)
 
 
+@lru_cache(maxsize=1024)
+def _expand_braces(path: str) -> Tuple[str, ...]:
+    """Expand brace expressions like foo{bar,baz}.
+
+    Supports nested braces.  For example, the pattern
+      '/Library/Application Support/Adobe{/CEP{/extensions,},}'
+    expands to the three paths:
+      '/Library/Application Support/Adobe/CEP/extensions'
+      '/Library/Application Support/Adobe/CEP'
+      '/Library/Application Support/Adobe'
+
+    A brace without a matching close is left as is.  Expansion works on a
+    stack of partially expanded paths: each step replaces the first brace
+    group with one path per option, and options are pushed in reverse so
+    results come out in order.  Results are cached, so a tuple is returned.
+    """
+    results: List[str] = []
+    stack = [path]
+    while stack:
+        cur = stack.pop()
+        # Find the first '{'
+        l = cur.find("{")
+        if l == -1:
+            results.append(cur)
+            continue
+        # Find the matching '}' and the top‑level commas inside it
+        depth = 0
+        r = -1
+        commas: List[int] = []
+        for idx in range(l, len(cur)):
+            ch = cur[idx]
+            if ch == "{":
+                depth += 1
+            elif ch == "}":
+                depth -= 1
+                if depth == 0:
+                    r = idx
+                    break
+            elif ch == "," and depth == 1:
+                commas.append(idx)
+        # If no closing brace found, keep the path as is
+        if r == -1:
+            results.append(cur)
+            continue
+        before = cur[:l]
+        after = cur[r + 1 :]
+        bounds = [l] + commas + [r]
+        stack.extend(
+            before + cur[bounds[i] + 1 : bounds[i + 1]] + after
+            for i in range(len(bounds) - 2, -1, -1)
+        )
+    return tuple(results)
+
+
 ###############################################################################
 # Core rule generation
 
+# Fixed leading words of rules whose only varying part is a final path or
+# label.  Appending the sudo_escape()d argument gives the same text as
+# join_command() without rebuilding the argument list for every path.
+RM_RF_COMMAND = "/bin/rm -r -f -- "
+RM_F_COMMAND = "/bin/rm -f -- "
+RMDIR_COMMAND = "/bin/rmdir -- "
+LAUNCHCTL_COMMANDS = ("/bin/launchctl list ", "/bin/launchctl remove ")
+
+
+@lru_cache(maxsize=8192)
+def _launchd_plist_rm_args(name: str) -> Tuple[str, str]:
+    """Return the escaped, wildcarded daemon and agent plist paths for `name`.
+
+    Both launchctl labels and quit process names permit removing
+    ``<name>.plist`` from /Library/LaunchDaemons and /Library/LaunchAgents;
+    the same names recur across variants and casks, so the paths are
+    cached.  They keep os.path.join semantics for names starting with '/'.
+    """
+    plist_name = name + ".plist"
+    daemon_plist = os.path.join("/Library/LaunchDaemons", plist_name)
+    agent_plist = os.path.join("/Library/LaunchAgents", plist_name)
+    return (
+        sudo_escape(_wildcard_delete_path(daemon_plist)),
+        sudo_escape(_wildcard_delete_path(agent_plist)),
+    )
+
+
+# Paths of the kext utilities.  To avoid enumerating multiple possible
+# locations, we choose the path of each utility based on which exists on
+# the system.  On modern macOS, these utilities are typically in
+# /usr/sbin; older systems may have them in /sbin.  We pick the first
+# existing executable, falling back to /usr/sbin.  This does not change
+# while the script runs, so it is resolved once at import.  The search
+# path is fixed rather than taken from PATH: sudoers rules must name the
+# system binaries, not e.g. Homebrew's coreutils.
+KEXT_TOOL_PATHS = {
+    cmd: shutil.which(cmd, path="/usr/sbin:/sbin") or f"/usr/sbin/{cmd}"
+    for cmd in ("kextstat", "kextunload", "kextload", "kextfind")
+}
+
+# Paths of the process and xargs utilities, chosen the same way: prefer
+# /usr/bin, then /bin, falling back to /usr/bin.
+USERBIN_PATHS = {
+    cmd: shutil.which(cmd, path="/usr/bin:/bin") or f"/usr/bin/{cmd}"
+    for cmd in ("pkill", "killall", "xargs")
+}
+
+
+# -----------------------------------------------------------------------------
+# Artifact collection
+#
+# Each collector takes the value of one artifact stanza and appends what it
+# finds to the named lists in `found`, which generate_sudoers_for_cask then
+# turns into rules.
+
+ARTIFACT_LISTS = (
+    "apps",
+    "pkgs",
+    "installer_scripts",
+    "installer_manuals",
+    "uninst_pkgutil",
+    "uninst_launch",
+    "uninst_scripts",
+    "uninst_delete",
+    "uninst_rmdir",
+    "uninst_setown",
+    "uninst_trash",
+    "uninst_kexts",
+    "uninst_signals",
+    "uninst_quit",
+)
+
+
+def _collect_app(value: Any, found: Dict[str, List[Any]]) -> None:
+    """Collect (source, target) pairs from an `app` stanza."""
+    apps = found["apps"]
+    for entry in ensure_list(value):
+        if isinstance(entry, str):
+            apps.append((entry, None))
+        elif isinstance(entry, dict):
+            src = (
+                entry.get("path")
+                or entry.get("source")
+                or entry.get("app")
+                or entry.get("target")
+                or ""
+            )
+            tgt = entry.get("target")
+            if not src and tgt:
+                src = os.path.basename(tgt)
+            if src:
+                apps.append((src, tgt))
+
+
+def _collect_pkg(value: Any, found: Dict[str, List[Any]]) -> None:
+    """Collect installer package names from a `pkg` stanza."""
+    for entry in ensure_list(value):
+        if isinstance(entry, str):
+            found["pkgs"].append(entry)
+
+
+def _collect_installer(value: Any, found: Dict[str, List[Any]]) -> None:
+    """Collect sudo scripts and manual installers from an `installer` stanza."""
+    if isinstance(value, dict):
+        items = [value]
+    elif isinstance(value, list):
+        items = [it for it in value if isinstance(it, dict)]
+    else:
+        return
+    for it in items:
+        if it.get("script") and it["script"].get("sudo"):
+            found["installer_scripts"].append(
+                {
+                    "exec": it["script"]["executable"],
+                    "args": ensure_list(it["script"].get("args")),
+                }
+            )
+        if it.get("manual"):
+            found["installer_manuals"].append(it["manual"])
+
+
+def _collect_uninstall(value: Any, found: Dict[str, List[Any]]) -> None:
+    """Collect the privileged directives of an `uninstall` stanza."""
+    for entry in ensure_list(value):
+        if not isinstance(entry, dict):
+            continue
+        extend_list(found["uninst_pkgutil"], entry.get("pkgutil"))
+        extend_list(found["uninst_launch"], entry.get("launchctl"))
+        extend_list(found["uninst_delete"], entry.get("delete"))
+        extend_list(found["uninst_rmdir"], entry.get("rmdir"))
+        extend_list(found["uninst_trash"], entry.get("trash"))
+        # collect kernel extensions (kext) identifiers for unloading
+        extend_list(found["uninst_kexts"], entry.get("kext"))
+        # Collect uninstall scripts.  Handle both `script` and
+        # `early_script` keys.  Some casks specify an "early_script"
+        # (or uninstall_preflight) that should run with sudo.  Treat
+        # these similarly to regular uninstall scripts.
+        for scr in (entry.get("script"), entry.get("early_script")):
+            if scr and isinstance(scr, dict) and scr.get("sudo"):
+                found["uninst_scripts"].append(
+                    {
+                        "exec": scr.get("executable"),
+                        "args": ensure_list(scr.get("args")),
+                    }
+                )
+
+        # Some uninstall definitions use "uninstall_preflight" or
+        # "uninstall_postflight" keys with procs (e.g. Adobe).  These
+        # callbacks may run privileged commands (like pluginkit
+        # invocations) but they are executed internally by brew and
+        # cannot be whitelisted generically.  We ignore them here.
+
+        if entry.get("set_ownership"):
+            extend_list(found["uninst_setown"], entry["set_ownership"])
+        # collect signal directives for pkill/killall operations
+        sigs = entry.get("signal")
+        if sigs:
+            for sig in ensure_list(sigs):
+                # Expect [SIGNAL, PROCESS] pairs
+                if isinstance(sig, list) and len(sig) == 2:
+                    signame, process = sig
+                    found["uninst_signals"].append((str(signame), str(process)))
+
+        # collect processes to quit gracefully via killall
+        qu = entry.get("quit")
+        if qu:
+            for proc in ensure_list(qu):
+                if isinstance(proc, str):
+                    found["uninst_quit"].append(proc)
+
+
+def _collect_zap(value: Any, found: Dict[str, List[Any]]) -> None:
+    """Collect paths removed by a `zap` stanza."""
+    for entry in ensure_list(value):
+        if isinstance(entry, dict):
+            extend_list(found["uninst_delete"], entry.get("delete"))
+            extend_list(found["uninst_rmdir"], entry.get("rmdir"))
+            extend_list(found["uninst_trash"], entry.get("trash"))
+
+
+# Collectors keyed by artifact stanza, in the order they are applied to a
+# dict with several stanzas.
+_ARTIFACT_COLLECTORS = {
+    "app": _collect_app,
+    "pkg": _collect_pkg,
+    "installer": _collect_installer,
+    "uninstall": _collect_uninstall,
+    "zap": _collect_zap,
+}
+
 
 def generate_sudoers_for_cask(
     token: str, cj: Dict[str, Any], user: str, brew_prefix: str, swift_util: str
@@ -1060,134 +1626,60 @@ def generate_sudoers_for_cask(
     packages, executing scripts, managing launchctl services, forgetting
     pkgutil receipts, and deleting files and directories.
     """
+    # user and brew_prefix are repeated in nearly every rule and are the
+    # keys of the cached path helpers; interning them lets those lookups
+    # match on identity rather than comparing characters.
+    user = sys.intern(user)
+    brew_prefix = sys.intern(brew_prefix)
     arts = parse_artifacts(cj)
-    # Extract relevant data
-    apps: List[Tuple[str, Optional[str]]] = []
-    pkgs: List[str] = []
-    installer_scripts: List[Dict[str, Any]] = []
-    installer_manuals: List[str] = []
-    uninst_pkgutil: List[str] = []
-    uninst_launch: List[str] = []
-    uninst_scripts: List[Dict[str, Any]] = []
-    uninst_delete: List[str] = []
-    uninst_rmdir: List[str] = []
-    uninst_setown: List[str] = []
-    uninst_trash: List[str] = []
-    uninst_kexts: List[str] = []
-    uninst_signals: List[Tuple[str, str]] = []
-    # Processes listed under uninstall->quit directives (to be terminated via killall)
-    uninst_quit: List[str] = []
+    # Extract relevant data.  Artifact dicts normally hold a single
+    # stanza, so dispatch on their keys directly; the rare multi-key dict
+    # is walked in the fixed stanza order of _ARTIFACT_COLLECTORS.
+    found: Dict[str, List[Any]] = {name: [] for name in ARTIFACT_LISTS}
     for obj in arts:
-        if "app" in obj:
-            for entry in ensure_list(obj["app"]):
-                if isinstance(entry, str):
-                    apps.append((entry, None))
-                elif isinstance(entry, dict):
-                    src = (
-                        entry.get("path")
-                        or entry.get("source")
-                        or entry.get("app")
-                        or entry.get("target")
-                        or ""
-                    )
-                    tgt = entry.get("target")
-                    if not src and tgt:
-                        src = os.path.basename(tgt)
-                    if src:
-                        apps.append((src, tgt))
-        if "pkg" in obj:
-            for entry in ensure_list(obj["pkg"]):
-                if isinstance(entry, str):
-                    pkgs.append(entry)
-        if "installer" in obj:
-            inst = obj["installer"]
-            if isinstance(inst, dict):
-                if inst.get("script") and inst["script"].get("sudo"):
-                    installer_scripts.append(
-                        {
-                            "exec": inst["script"]["executable"],
-                            "args": ensure_list(inst["script"].get("args")),
-                        }
-                    )
-                if inst.get("manual"):
-                    installer_manuals.append(inst["manual"])
-            elif isinstance(inst, list):
-                for it in inst:
-                    if not isinstance(it, dict):
-                        continue
-                    if it.get("script") and it["script"].get("sudo"):
-                        installer_scripts.append(
-                            {
-                                "exec": it["script"]["executable"],
-                                "args": ensure_list(it["script"].get("args")),
-                            }
-                        )
-                    if it.get("manual"):
-                        installer_manuals.append(it["manual"])
-        if "uninstall" in obj:
-            for entry in ensure_list(obj["uninstall"]):
-                if not isinstance(entry, dict):
-                    continue
-                uninst_pkgutil += ensure_list(entry.get("pkgutil"))
-                uninst_launch += ensure_list(entry.get("launchctl"))
-                uninst_delete += ensure_list(entry.get("delete"))
-                uninst_rmdir += ensure_list(entry.get("rmdir"))
-                uninst_trash += ensure_list(entry.get("trash"))
-                # collect kernel extensions (kext) identifiers for unloading
-                uninst_kexts += ensure_list(entry.get("kext"))
-                # Collect uninstall scripts.  Handle both `script` and
-                # `early_script` keys.  Some casks specify an "early_script"
-                # (or uninstall_preflight) that should run with sudo.  Treat
-                # these similarly to regular uninstall scripts.
-                script_entry = entry.get("script")
-                early_script_entry = entry.get("early_script")
-                for scr in (script_entry, early_script_entry):
-                    if scr and isinstance(scr, dict) and scr.get("sudo"):
-                        uninst_scripts.append(
-                            {
-                                "exec": scr.get("executable"),
-                                "args": ensure_list(scr.get("args")),
-                            }
-                        )
-
-                # Some uninstall definitions use "uninstall_preflight" or
-                # "uninstall_postflight" keys with procs (e.g. Adobe).  These
-                # callbacks may run privileged commands (like pluginkit
-                # invocations) but they are executed internally by brew and
-                # cannot be whitelisted generically.  We ignore them here.
-
-                if entry.get("set_ownership"):
-                    uninst_setown += ensure_list(entry["set_ownership"])
-                # collect signal directives for pkill/killall operations
-                sigs = entry.get("signal")
-                if sigs:
-                    for sig in ensure_list(sigs):
-                        # Expect [SIGNAL, PROCESS] pairs
-                        if isinstance(sig, list) and len(sig) == 2:
-                            signame, process = sig
-                            uninst_signals.append((str(signame), str(process)))
-
-                # collect processes to quit gracefully via killall
-                qu = entry.get("quit")
-                if qu:
-                    for proc in ensure_list(qu):
-                        if isinstance(proc, str):
-                            uninst_quit.append(proc)
-        if "zap" in obj:
-            for entry in ensure_list(obj["zap"]):
-                if isinstance(entry, dict):
-                    uninst_delete += ensure_list(entry.get("delete"))
-                    uninst_rmdir += ensure_list(entry.get("rmdir"))
-                    uninst_trash += ensure_list(entry.get("trash"))
+        keys = obj if len(obj) == 1 else [k for k in _ARTIFACT_COLLECTORS if k in obj]
+        for key in keys:
+            collect = _ARTIFACT_COLLECTORS.get(key)
+            if collect is not None:
+                collect(obj[key], found)
+    apps: List[Tuple[str, Optional[str]]] = found["apps"]
+    pkgs: List[str] = found["pkgs"]
+    installer_scripts: List[Dict[str, Any]] = found["installer_scripts"]
+    installer_manuals: List[str] = found["installer_manuals"]
+    uninst_pkgutil: List[str] = found["uninst_pkgutil"]
+    uninst_launch: List[str] = found["uninst_launch"]
+    uninst_scripts: List[Dict[str, Any]] = found["uninst_scripts"]
+    uninst_delete: List[str] = found["uninst_delete"]
+    uninst_rmdir: List[str] = found["uninst_rmdir"]
+    uninst_setown: List[str] = found["uninst_setown"]
+    uninst_trash: List[str] = found["uninst_trash"]
+    uninst_kexts: List[str] = found["uninst_kexts"]
+    uninst_signals: List[Tuple[str, str]] = found["uninst_signals"]
+    # Processes listed under uninstall->quit directives (to be terminated via killall)
+    uninst_quit: List[str] = found["uninst_quit"]
 
     # Determine destination override from uninstall entries
     dest_override = determine_dest_dir({"delete": uninst_delete, "trash": uninst_trash})
-    lines: List[str] = []
+    # Rules are collected in a dict used as an ordered set, so a rule
+    # emitted twice (e.g. a path listed under both delete and trash) is
+    # only kept the first time.
+    lines: Dict[str, None] = {}
+    emit = lines.setdefault
+    # Every rule starts with the same user/tag prefix; build it once.
+    rule_prefix = f"{user} ALL=(ALL) NOPASSWD: SETENV: "
+    # Rules repeated for many paths or labels only differ in their last
+    # argument, so their leading part is built once here.
+    rm_rf_rule = rule_prefix + RM_RF_COMMAND
+    rm_f_rule = rule_prefix + RM_F_COMMAND
+    rmdir_rule = rule_prefix + RMDIR_COMMAND
+    launchctl_rules = [rule_prefix + cmd for cmd in LAUNCHCTL_COMMANDS]
     # Generate rules for each app
     for src_rel, tgt_rel in apps:
-        # Source glob and destination path
+        # Source glob and destination path.  These come from cask metadata
+        # and may be absolute or end in '/', so they keep os.path.join
+        # semantics; fixed paths elsewhere are built with f-strings.
         src_glob = os.path.join(brew_prefix, "Caskroom", token, "*", src_rel)
-        src_glob_w = _wildcard_cask_path(src_glob, token)
+        src_glob_w = _wildcard_cask_path(src_glob, token, brew_prefix)
         # Further generalise the source app path itself (e.g. 'Alfred 5.app'
         # -> 'Alfred *.app') by wildcarding numeric suffixes in the final
         # bundle name.  This uses `_wildcard_app_path` which handles
@@ -1206,53 +1698,40 @@ def generate_sudoers_for_cask(
                 dest_path = os.path.join(dest_dir, src_rel)
         dest_path_w = _wildcard_app_path(dest_path)
         # 1. Remove app bundle and its contents
-        lines.append(
-            f"{user} ALL=(ALL) NOPASSWD: SETENV: "
-            + join_command("/bin/rm", ["-R", "-f", "--", dest_path_w])
-        )
+        emit(rule_prefix + join_command("/bin/rm", ["-R", "-f", "--", dest_path_w]))
         # Remove contents directory separately (brew may call this)
-        lines.append(
-            f"{user} ALL=(ALL) NOPASSWD: SETENV: "
+        emit(
+            rule_prefix
             + join_command(
                 "/bin/rm", ["-R", "-f", "--", os.path.join(dest_path_w, "Contents")]
             )
         )
         # 2. Remove sentinel file if present (both variants)
         sentinel = os.path.join(dest_path_w, ".homebrew-write-test")
-        lines.append(
-            f"{user} ALL=(ALL) NOPASSWD: SETENV: "
-            + join_command("/usr/bin/touch", [sentinel.replace(" ", "\\ ")])
-        )
-        lines.append(
-            f"{user} ALL=(ALL) NOPASSWD: SETENV: "
-            + join_command("/bin/rm", [sentinel.replace(" ", "\\ ")])
-        )
-        lines.append(
-            f"{user} ALL=(ALL) NOPASSWD: SETENV: "
-            + join_command("/bin/rm", ["-f", "--", sentinel.replace(" ", "\\ ")])
-        )
+        # Pre-escape spaces once for the three sentinel rules below
+        sentinel_esc = sentinel.replace(" ", "\\ ")
+        emit(rule_prefix + join_command("/usr/bin/touch", [sentinel_esc]))
+        emit(rule_prefix + join_command("/bin/rm", [sentinel_esc]))
+        emit(rule_prefix + join_command("/bin/rm", ["-f", "--", sentinel_esc]))
         # 3. Copy app and contents
-        lines.append(
-            f"{user} ALL=(ALL) NOPASSWD: SETENV: "
-            + join_command("/bin/cp", ["-pR", src_glob_w, dest_path_w])
-        )
-        lines.append(
-            f"{user} ALL=(ALL) NOPASSWD: SETENV: "
+        emit(rule_prefix + join_command("/bin/cp", ["-pR", src_glob_w, dest_path_w]))
+        emit(
+            rule_prefix
             + join_command(
                 "/bin/cp", ["-pR", os.path.join(src_glob_w, "Contents"), dest_path_w]
             )
         )
         # 4. Copy extended attributes (system swift and CLT swift)
-        lines.append(
-            f"{user} ALL=(ALL) NOPASSWD: SETENV: "
+        emit(
+            rule_prefix
             + join_command(
                 "/usr/bin/swift",
                 ["-target", "arm64-apple-macosx*", swift_util, src_glob_w, dest_path_w],
             )
         )
-        clt_swift = os.path.join("/Library/Developer/CommandLineTools/usr/bin/swift")
-        lines.append(
-            f"{user} ALL=(ALL) NOPASSWD: SETENV: "
+        clt_swift = "/Library/Developer/CommandLineTools/usr/bin/swift"
+        emit(
+            rule_prefix
             + join_command(
                 clt_swift,
                 ["-target", "arm64-apple-macosx*", swift_util, src_glob_w, dest_path_w],
@@ -1269,27 +1748,27 @@ def generate_sudoers_for_cask(
         #    like '*:staff' which could over‑authorise.
         dest_contents_path = dest_path_w + "/Contents"
         # Permit changing ownership to user:staff on the bundle root
-        lines.append(
-            f"{user} ALL=(ALL) NOPASSWD: SETENV: "
+        emit(
+            rule_prefix
             + join_command(
                 "/usr/sbin/chown", ["-R", "--", f"{user}:staff", dest_path_w]
             )
         )
         # Permit changing ownership to user:staff on the Contents directory
-        lines.append(
-            f"{user} ALL=(ALL) NOPASSWD: SETENV: "
+        emit(
+            rule_prefix
             + join_command(
                 "/usr/sbin/chown", ["-R", "--", f"{user}:staff", dest_contents_path]
             )
         )
         # Permit changing ownership to user alone on the bundle root
-        lines.append(
-            f"{user} ALL=(ALL) NOPASSWD: SETENV: "
+        emit(
+            rule_prefix
             + join_command("/usr/sbin/chown", ["-R", "--", user, dest_path_w])
         )
         # Permit changing ownership to user alone on the Contents directory
-        lines.append(
-            f"{user} ALL=(ALL) NOPASSWD: SETENV: "
+        emit(
+            rule_prefix
             + join_command("/usr/sbin/chown", ["-R", "--", user, dest_contents_path])
         )
 
@@ -1298,14 +1777,15 @@ def generate_sudoers_for_cask(
         pkg_w = _wildcard_cask_path(
             os.path.join(brew_prefix, "Caskroom", token, "*", _wildcard_pkg_name(pkg)),
             token,
+            brew_prefix,
         )
         # Permit installer invocation with a wildcard target to accommodate
         # variations like '-target / -verboseR' or other flags.  We use
         # '*'' after '-target' rather than a literal '/' to allow optional
         # arguments following the target.  Do not append a trailing '*' to
         # avoid producing overly broad rules.
-        lines.append(
-            f"{user} ALL=(ALL) NOPASSWD: SETENV: "
+        emit(
+            rule_prefix
             + join_command("/usr/sbin/installer", ["-pkg", pkg_w, "-target", "*"])
         )
 
@@ -1313,13 +1793,10 @@ def generate_sudoers_for_cask(
     for sc in installer_scripts:
         exe = sc["exec"]
         if not exe.startswith("/"):
-            exe = os.path.join(brew_prefix, "Caskroom", token, "*", exe)
-        exe_w = _wildcard_cask_path(_wildcard_script_name(exe), token)
+            exe = f"{brew_prefix}/Caskroom/{token}/*/{exe}"
+        exe_w = _wildcard_cask_path(_wildcard_script_name(exe), token, brew_prefix)
         args = sc.get("args", [])
-        lines.append(
-            f"{user} ALL=(ALL) NOPASSWD: SETENV: "
-            + join_command(exe_w, args, allow_trailing_star=True)
-        )
+        emit(rule_prefix + join_command(exe_w, args, allow_trailing_star=True))
 
     # manual installers (app within DMG)
     for man in installer_manuals:
@@ -1334,19 +1811,13 @@ def generate_sudoers_for_cask(
             "MacOS",
             os.path.splitext(os.path.basename(man))[0] + "*",
         )
-        exe_w = _wildcard_cask_path(exe_glob, token)
-        lines.append(
-            f"{user} ALL=(ALL) NOPASSWD: SETENV: "
-            + join_command(exe_w, [], allow_trailing_star=True)
-        )
+        exe_w = _wildcard_cask_path(exe_glob, token, brew_prefix)
+        emit(rule_prefix + join_command(exe_w, [], allow_trailing_star=True))
 
     # pkgutil forget
     for pid in uninst_pkgutil:
         pid_w = _wildcard_pkgutil_id(str(pid))
-        lines.append(
-            f"{user} ALL=(ALL) NOPASSWD: SETENV: "
-            + join_command("/usr/sbin/pkgutil", ["--forget", pid_w])
-        )
+        emit(rule_prefix + join_command("/usr/sbin/pkgutil", ["--forget", pid_w]))
 
     # launchctl operations
     for lbl in uninst_launch:
@@ -1362,48 +1833,25 @@ def generate_sudoers_for_cask(
         # launchctl commands for the base label (e.g. com.adobe.agsservice)
         # are permitted, while also covering installer variants and helper
         # versions.  Deduplicate while preserving order.
-        base_labels: List[str] = [lbl_str]
-        variants = _wildcard_launchctl_labels(lbl_str)
-        for v in variants:
-            if v not in base_labels:
-                base_labels.append(v)
+        base_labels = dict.fromkeys((lbl_str, *_wildcard_launchctl_labels(lbl_str)))
         for label in base_labels:
-            for action in ("list", "remove"):
-                lines.append(
-                    f"{user} ALL=(ALL) NOPASSWD: SETENV: "
-                    + join_command("/bin/launchctl", [action, label])
-                )
-            # Remove associated launchd plist files for each label
-            for base_dir in ("/Library/LaunchDaemons", "/Library/LaunchAgents"):
-                plist_path = os.path.join(base_dir, label + ".plist")
-                p_w = _wildcard_delete_path(plist_path)
-                lines.append(
-                    f"{user} ALL=(ALL) NOPASSWD: SETENV: "
-                    + join_command("/bin/rm", ["-f", "--", p_w])
-                )
-        # If the original label contains '.helper', also add removal of its exact plist.
-        # This is redundant if the helper wildcard variant is identical to the
-        # original label, but harmless.
-        if ".helper" in lbl_str:
-            for base_dir in ("/Library/LaunchDaemons", "/Library/LaunchAgents"):
-                helper_plist = os.path.join(base_dir, lbl_str + ".plist")
-                p_w = _wildcard_delete_path(helper_plist)
-                lines.append(
-                    f"{user} ALL=(ALL) NOPASSWD: SETENV: "
-                    + join_command("/bin/rm", ["-f", "--", p_w])
-                )
+            label_esc = sudo_escape(label)
+            for launchctl_rule in launchctl_rules:
+                emit(launchctl_rule + label_esc)
+            # Remove associated launchd plist files for each label.  Since
+            # base_labels always starts with the original label, this also
+            # covers the exact plist of '.helper' labels.
+            for plist_esc in _launchd_plist_rm_args(label):
+                emit(rm_f_rule + plist_esc)
 
     # uninstall scripts (sudo)
     for sc in uninst_scripts:
         exe = sc["exec"]
         if not exe.startswith("/"):
-            exe = os.path.join(brew_prefix, "Caskroom", token, "*", exe)
-        exe_w = _wildcard_cask_path(_wildcard_script_name(exe), token)
+            exe = f"{brew_prefix}/Caskroom/{token}/*/{exe}"
+        exe_w = _wildcard_cask_path(_wildcard_script_name(exe), token, brew_prefix)
         args = sc.get("args", [])
-        lines.append(
-            f"{user} ALL=(ALL) NOPASSWD: SETENV: "
-            + join_command(exe_w, args, allow_trailing_star=True)
-        )
+        emit(rule_prefix + join_command(exe_w, args, allow_trailing_star=True))
 
     # delete/trash paths
     # For each path slated for deletion or trash, generate both recursive
@@ -1413,85 +1861,22 @@ def generate_sudoers_for_cask(
         # Only process string paths
         if not isinstance(p, str):
             continue
-        p_w = _wildcard_delete_path(str(p))
+        p_esc = sudo_escape(_wildcard_delete_path(str(p)))
         # Recursive removal (-r -f)
-        lines.append(
-            f"{user} ALL=(ALL) NOPASSWD: SETENV: "
-            + join_command("/bin/rm", ["-r", "-f", "--", p_w])
-        )
+        emit(rm_rf_rule + p_esc)
         # Non‑recursive removal (-f)
-        lines.append(
-            f"{user} ALL=(ALL) NOPASSWD: SETENV: "
-            + join_command("/bin/rm", ["-f", "--", p_w])
-        )
+        emit(rm_f_rule + p_esc)
 
     # rmdir paths
-    # Expand brace patterns in rmdir paths (e.g. Adobe{/CEP{/extensions,},}) into
-    # individual directories.  Sudoers cannot interpret brace syntax, so
-    # transform such patterns into explicit paths.  This implementation
-    # recursively expands nested braces as well as top‑level comma lists.
-    def expand_braces(path: str) -> List[str]:
-        """Recursively expand brace expressions like foo{bar,baz}.
-
-        Supports nested braces.  For example, the pattern
-          '/Library/Application Support/Adobe{/CEP{/extensions,},}'
-        expands to the three paths:
-          '/Library/Application Support/Adobe/CEP/extensions'
-          '/Library/Application Support/Adobe/CEP'
-          '/Library/Application Support/Adobe'
-        """
-        # Find the first '{'
-        l = path.find("{")
-        if l == -1:
-            return [path]
-        # Find matching '}' for the first '{'
-        depth = 0
-        r = None
-        for idx, ch in enumerate(path[l:], start=l):
-            if ch == "{":
-                depth += 1
-            elif ch == "}":
-                depth -= 1
-                if depth == 0:
-                    r = idx
-                    break
-        # If no closing brace found, return path as is
-        if r is None:
-            return [path]
-        before = path[:l]
-        inside = path[l + 1 : r]
-        after = path[r + 1 :]
-        # Split the inside on top‑level commas
-        options: List[str] = []
-        depth2 = 0
-        start = 0
-        for i, ch in enumerate(inside):
-            if ch == "{":
-                depth2 += 1
-            elif ch == "}":
-                depth2 -= 1
-            elif ch == "," and depth2 == 0:
-                options.append(inside[start:i])
-                start = i + 1
-        options.append(inside[start:])
-        results: List[str] = []
-        # Recursively expand each option and the remainder of the string
-        for opt in options:
-            for opt_exp in expand_braces(opt):
-                for after_exp in expand_braces(after):
-                    results.append(before + opt_exp + after_exp)
-        return results
-
     for p in uninst_rmdir:
         # Only process string paths
         if not isinstance(p, str):
             continue
-        for exp in expand_braces(str(p)):
+        # Sudoers cannot interpret brace syntax, so expand patterns such
+        # as Adobe{/CEP{/extensions,},} into individual directories.
+        for exp in _expand_braces(str(p)):
             p_w = _wildcard_delete_path(exp)
-            lines.append(
-                f"{user} ALL=(ALL) NOPASSWD: SETENV: "
-                + join_command("/bin/rmdir", ["--", p_w])
-            )
+            emit(rmdir_rule + sudo_escape(p_w))
 
     # set ownership
     for p in uninst_setown:
@@ -1504,125 +1889,65 @@ def generate_sudoers_for_cask(
         # the staff group, and the target user alone.  This avoids
         # broad '*:staff' rules.
         # Change ownership to user:staff
-        lines.append(
-            f"{user} ALL=(ALL) NOPASSWD: SETENV: "
+        emit(
+            rule_prefix
             + join_command("/usr/sbin/chown", ["-R", "--", f"{user}:staff", p_w])
         )
         # Change ownership to user alone
-        lines.append(
-            f"{user} ALL=(ALL) NOPASSWD: SETENV: "
-            + join_command("/usr/sbin/chown", ["-R", "--", user, p_w])
-        )
+        emit(rule_prefix + join_command("/usr/sbin/chown", ["-R", "--", user, p_w]))
 
     # kernel extension operations
     # For any kext identifiers specified in uninstall directives, permit
-    # listing, loading and unloading the kext without a password.  To
-    # avoid enumerating multiple possible locations, we dynamically
-    # choose the path of kext utilities based on which exists on the
-    # system.  On modern macOS, these utilities are typically in
-    # /usr/sbin; older systems may have them in /sbin.  We pick the
-    # first existing path.
-    def choose_kext_path(cmd: str) -> str:
-        for base in ("/usr/sbin", "/sbin"):
-            p = os.path.join(base, cmd)
-            if os.path.exists(p):
-                return p
-        # fallback to /usr/sbin
-        return os.path.join("/usr/sbin", cmd)
-
+    # listing, loading and unloading the kext without a password, using
+    # the utility paths resolved once in KEXT_TOOL_PATHS.
     for kext in uninst_kexts:
         k = str(kext)
         # list loaded kernel extension
-        lines.append(
-            f"{user} ALL=(ALL) NOPASSWD: SETENV: "
-            + join_command(choose_kext_path("kextstat"), ["-l", "-b", k])
-        )
+        emit(rule_prefix + join_command(KEXT_TOOL_PATHS["kextstat"], ["-l", "-b", k]))
         # unload the kernel extension
-        lines.append(
-            f"{user} ALL=(ALL) NOPASSWD: SETENV: "
-            + join_command(choose_kext_path("kextunload"), ["-b", k])
-        )
+        emit(rule_prefix + join_command(KEXT_TOOL_PATHS["kextunload"], ["-b", k]))
         # allow loading as well (some installers load kexts)
-        lines.append(
-            f"{user} ALL=(ALL) NOPASSWD: SETENV: "
-            + join_command(choose_kext_path("kextload"), ["-b", k])
-        )
+        emit(rule_prefix + join_command(KEXT_TOOL_PATHS["kextload"], ["-b", k]))
         # permit searching for kexts
-        lines.append(
-            f"{user} ALL=(ALL) NOPASSWD: SETENV: "
-            + join_command(choose_kext_path("kextfind"), ["-b", k])
-        )
+        emit(rule_prefix + join_command(KEXT_TOOL_PATHS["kextfind"], ["-b", k]))
 
     # signal operations (pkill/killall) for uninstall 'signal' directives
     # For each specified signal and process name, permit sending the signal
     # via pkill and killall.  We also generate variants of the process name
     # by applying _wildcard_launchctl_labels to cover version or hashed
     # suffixes.
+    # As with rm and launchctl above, everything up to the process name is
+    # built once (per signal) and the escaped name is appended.
+    killall_rule = f"{rule_prefix}{sudo_escape(USERBIN_PATHS['killall'])} "
     for signame, proc in uninst_signals:
         # Determine process variants: base and wildcarded
-        proc_variants: List[str] = [proc]
-        variants = _wildcard_launchctl_labels(proc)
         # If wildcard variants exist, prefer them over the exact process
-        if variants:
-            proc_variants = variants
-        else:
-            proc_variants = [proc]
-
-        # Function to select pkill/killall path
-        def choose_userbin(cmd: str) -> str:
-            for base in ("/usr/bin", "/bin"):
-                p = os.path.join(base, cmd)
-                if os.path.exists(p):
-                    return p
-            return os.path.join("/usr/bin", cmd)
+        proc_variants = _wildcard_launchctl_labels(proc) or (proc,)
+        sig_esc = sudo_escape(f"-{signame}")
+        pkill_sig_rule = (
+            f"{rule_prefix}{sudo_escape(USERBIN_PATHS['pkill'])} {sig_esc} -x "
+        )
+        killall_sig_rule = f"{killall_rule}{sig_esc} "
 
         # For each process variant, allow pkill and killall from chosen path
         for p in proc_variants:
-            pkill_path = choose_userbin("pkill")
-            killall_path = choose_userbin("killall")
-            lines.append(
-                f"{user} ALL=(ALL) NOPASSWD: SETENV: "
-                + join_command(pkill_path, [f"-{signame}", "-x", p])
-            )
-            lines.append(
-                f"{user} ALL=(ALL) NOPASSWD: SETENV: "
-                + join_command(killall_path, [f"-{signame}", p])
-            )
+            p_esc = sudo_escape(p)
+            emit(pkill_sig_rule + p_esc)
+            emit(killall_sig_rule + p_esc)
 
     # quit operations (killall without signal) for uninstall 'quit' directives
     # For each process listed in the cask's uninstall->quit, allow killall without a signal.
     # We also generate wildcard variants using _wildcard_launchctl_labels to cover hashed or versioned suffixes.
     for proc in uninst_quit:
-        proc_variants: List[str] = [proc]
-        variants = _wildcard_launchctl_labels(proc)
         # If wildcard variants exist, prefer them over the exact process
-        if variants:
-            proc_variants = variants
-        else:
-            proc_variants = [proc]
+        proc_variants = _wildcard_launchctl_labels(proc) or (proc,)
 
-        # Choose killall path once
-        def choose_userbin(cmd: str) -> str:
-            for base in ("/usr/bin", "/bin"):
-                p = os.path.join(base, cmd)
-                if os.path.exists(p):
-                    return p
-            return os.path.join("/usr/bin", cmd)
-
-        killall_path = choose_userbin("killall")
         for p in proc_variants:
             # Permit killall without a signal
-            lines.append(
-                f"{user} ALL=(ALL) NOPASSWD: SETENV: " + join_command(killall_path, [p])
-            )
+            emit(killall_rule + sudo_escape(p))
             # Also allow removal of any associated launchd plist files for processes listed under quit.
-            for base_dir in ("/Library/LaunchDaemons", "/Library/LaunchAgents"):
-                plist_path = os.path.join(base_dir, p + ".plist")
-                p_w = _wildcard_delete_path(plist_path)
-                lines.append(
-                    f"{user} ALL=(ALL) NOPASSWD: SETENV: "
-                    + join_command("/bin/rm", ["-f", "--", p_w])
-                )
+            for plist_esc in _launchd_plist_rm_args(p):
+                emit(rm_f_rule + plist_esc)
 
     # ------------------------------------------------------------------
     # Additional cleanup operations used by Homebrew during pkg uninstall
@@ -1634,15 +1959,7 @@ def generate_sudoers_for_cask(
     # passed into this function and resolves to the user's Homebrew
     # installation path.
     try:
-        # Determine xargs binary path once (prefer /usr/bin, fallback to /bin)
-        def choose_xargs() -> str:
-            for base in ("/usr/bin", "/bin"):
-                p = os.path.join(base, "xargs")
-                if os.path.exists(p):
-                    return p
-            return "/usr/bin/xargs"
-
-        xargs_bin = choose_xargs()
+        xargs_bin = USERBIN_PATHS["xargs"]
         xargs_variants: List[Tuple[str, List[str]]] = [
             (xargs_bin, ["-0", "--", "/bin/rm", "--"]),
             (xargs_bin, ["-0", "--", "/bin/rm", "-r", "-f", "--"]),
@@ -1651,37 +1968,31 @@ def generate_sudoers_for_cask(
                 [
                     "-0",
                     "--",
-                    os.path.join(
-                        brew_prefix, "Library", "Homebrew", "cask", "utils", "rmdir.sh"
-                    ),
+                    f"{brew_prefix}/Library/Homebrew/cask/utils/rmdir.sh",
                 ],
             ),
         ]
         for exe, args in xargs_variants:
-            lines.append(
-                f"{user} ALL=(ALL) NOPASSWD: SETENV: " + join_command(exe, args)
-            )
+            emit(rule_prefix + join_command(exe, args))
     except Exception:
         # If brew_prefix is unavailable or os.path fails, skip adding xargs rules
         pass
 
-    # Deduplicate lines
-    unique_lines: List[str] = []
-    seen = set()
-    for ln in lines:
-        if ln not in seen:
-            seen.add(ln)
-            unique_lines.append(ln)
     # Apply version wildcarding to all generated lines.  The log parser
     # already calls `_wildcard_versions_in_rule`, but rules originating
     # from cask metadata (artifacts, uninstall directives, etc.) need
     # version generalisation as well.  This ensures that year‑like
     # segments (e.g. '.2025.'), minor/patch versions ('-1.0') and
     # hashed suffixes are replaced with '*' consistently across the
-    # entire sudoers file.
-    for i, ln in enumerate(unique_lines):
-        unique_lines[i] = _wildcard_versions_in_rule(ln)
-    return unique_lines
+    # entire sudoers file.  Deduplicating after wildcarding also drops
+    # rules that only differed in the version parts just replaced.  As in
+    # the log parser, rules with nothing version-like skip the passes.
+    hint = RULE_VERSION_HINT_RE.search
+    return list(
+        dict.fromkeys(
+            _wildcard_versions_in_rule(ln) if hint(ln) else ln for ln in lines
+        )
+    )
 
 
 def main() -> None:
@@ -1691,18 +2002,25 @@ def main() -> None:
         or run(["id", "-un"])
     )
     sudoers_out = os.environ.get("SUDOERS_OUT") or "./homebrew-cask.nopasswd.sudoers"
-    # Determine brew prefix and swift util path
-    try:
-        brew_prefix = run(["brew", "--prefix"])
-        repo = run(["brew", "--repository"])
-        swift_util = os.path.join(
-            repo, "Library", "Homebrew", "cask", "utils", "copy-xattrs.swift"
-        )
-    except Exception:
-        brew_prefix = "/opt/homebrew"
-        swift_util = os.path.join(
-            brew_prefix, "Library", "Homebrew", "cask", "utils", "copy-xattrs.swift"
-        )
+    # Determine brew prefix and swift util path.  `brew shellenv` exports
+    # both as environment variables; use those when set to avoid starting
+    # brew (and its Ruby runtime) twice.  The two are resolved separately
+    # so a known prefix is kept even if the repository lookup fails.
+    brew_prefix = (os.environ.get("HOMEBREW_PREFIX") or "").rstrip("/")
+    if not brew_prefix:
+        try:
+            brew_prefix = run(["brew", "--prefix"])
+        except Exception:
+            brew_prefix = "/opt/homebrew"
+    repo = (os.environ.get("HOMEBREW_REPOSITORY") or "").rstrip("/")
+    if not repo:
+        try:
+            repo = run(["brew", "--repository"])
+        except Exception:
+            repo = brew_prefix
+    swift_util = os.path.join(
+        repo, "Library", "Homebrew", "cask", "utils", "copy-xattrs.swift"
+    )
     # Determine casks to process
     casks_env = os.environ.get("CASKS")
     if casks_env:
@@ -1721,40 +2039,16 @@ def main() -> None:
         threads = 32
     if threads < 1:
         threads = 1
-
-    # Worker to process a single cask
-    def _process_cask(tok: str) -> Tuple[str, List[str]]:
-        cj = fetch_cask_json(tok)
-        if not cj:
-            return tok, [f"# {tok}: failed to fetch metadata", ""]
-        name_list = cj.get("name") or [tok]
-        display = name_list[0]
-        header = f"# ----------------------------\n# {display} ({tok})\n# ----------------------------"
-        rules = generate_sudoers_for_cask(tok, cj, target_user, brew_prefix, swift_util)
-        if not rules:
-            return tok, [header, "# No privileged actions detected", ""]
-        return tok, [header] + rules + [""]
-
-    # Process casks, using a thread pool when beneficial
-    results: List[Tuple[str, List[str]]] = []
-    if threads > 1 and len(tokens) > 1:
-        from concurrent.futures import ThreadPoolExecutor, as_completed
-
-        with ThreadPoolExecutor(max_workers=threads) as pool:
-            futures = {pool.submit(_process_cask, tok): tok for tok in tokens}
-            for fut in as_completed(futures):
-                tok, lines = fut.result()
-                results.append((tok, lines))
-    else:
-        # Fallback to sequential processing
-        for tok in tokens:
-            results.append(_process_cask(tok))
-
-    # Preserve original order of tokens
-    token_to_lines = {tok: lines for tok, lines in results}
+    # Optional number of worker processes for rule generation.  Rule
+    # generation is CPU-bound and holds the GIL, so for very large cask sets
+    # it can be spread over processes; by default (PROCESSES unset or 1)
+    # rules are generated by the threads below.
+    try:
+        processes = int((os.environ.get("PROCESSES") or "").strip())
+    except Exception:
+        processes = 1
 
     # Gather additional rules from logs (LOGS env or default .log file)
-    used_logs: List[str] = []
     log_env = os.environ.get("LOGS")
     log_paths: List[str] = []
     if log_env:
@@ -1770,21 +2064,122 @@ def main() -> None:
         default_log = base + ".log"
         if os.path.exists(default_log):
             log_paths.append(default_log)
-    # Parse logs into cask‑scoped extra rules
-    extra_rules_by_cask: Dict[Optional[str], List[str]] = {}
-    for log_path in log_paths:
-        if not os.path.exists(log_path):
-            continue
-        mapping = process_log_file_by_cask(log_path, target_user, brew_prefix)
-        used_logs.append(log_path)
+    # Logs that exist are parsed on the same pool as the casks below
+    used_logs: List[str] = [lp for lp in log_paths if os.path.exists(lp)]
+
+    # Fetch metadata for all casks with one brew call; only misses are
+    # fetched individually by the workers below.
+    prefetched = fetch_all_casks_json(tokens)
+
+    # Lines written for a cask with metadata: a header, then its rules
+    def _cask_lines(tok: str, cj: Dict[str, Any], rules: List[str]) -> List[str]:
+        name_list = cj.get("name") or [tok]
+        display = name_list[0]
+        header = f"# ----------------------------\n# {display} ({tok})\n# ----------------------------"
+        if not rules:
+            return [header, "# No privileged actions detected", ""]
+        return [header] + rules + [""]
+
+    # Worker to process a single cask
+    def _process_cask(tok: str) -> List[str]:
+        cj = prefetched.get(tok) or fetch_cask_json(tok)
+        if not cj:
+            return [f"# {tok}: failed to fetch metadata", ""]
+        rules = generate_sudoers_for_cask(tok, cj, target_user, brew_prefix, swift_util)
+        return _cask_lines(tok, cj, rules)
+
+    # With PROCESSES > 1, rules for casks whose metadata is already at hand
+    # are generated in a process pool, running alongside the threads that
+    # fetch the remaining casks and parse the logs.
+    pooled: Dict[str, Dict[str, Any]] = {}
+    gen_pool = None
+    gen_results: Iterable[List[str]] = ()
+    if processes > 1:
+        pooled = {tok: prefetched[tok] for tok in tokens if prefetched.get(tok)}
+    if len(pooled) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        from concurrent.futures.process import BrokenProcessPool
+        from itertools import repeat
+
+        try:
+            gen_pool = ProcessPoolExecutor(max_workers=processes)
+            gen_results = gen_pool.map(
+                generate_sudoers_for_cask,
+                list(pooled),
+                list(pooled.values()),
+                repeat(target_user),
+                repeat(brew_prefix),
+                repeat(swift_util),
+                chunksize=max(1, len(pooled) // (processes * 4)),
+            )
+        except (OSError, NotImplementedError):
+            # No working multiprocessing support; generate in threads
+            if gen_pool is not None:
+                gen_pool.shutdown(cancel_futures=True)
+            gen_pool = None
+    if gen_pool is None:
+        pooled = {}
+    # A token listed twice is only processed once; its block is still
+    # written for every occurrence below.
+    own_tokens = [tok for tok in dict.fromkeys(tokens) if tok not in pooled]
+    # Casks whose metadata is already at hand need no I/O, and their rule
+    # generation would only contend for the GIL in a worker thread, so
+    # they are processed on this thread.  The pool only gets the casks
+    # that still have to be fetched, plus the logs.
+    thread_tokens = [tok for tok in own_tokens if not prefetched.get(tok)]
+
+    # Process casks and parse logs, using a thread pool when beneficial.
+    # Log parsing is submitted first so that it overlaps with the brew and
+    # network waits of the cask workers.
+    # Each worker's block is stored by token as it completes; blocks are
+    # written in the original token order once everything is done.
+    token_to_lines: Dict[str, List[str]] = {}
+    log_mappings: List[Dict[Optional[str], List[str]]] = []
+    try:
+        if threads > 1 and len(thread_tokens) + len(used_logs) > 1:
+            from concurrent.futures import ThreadPoolExecutor, as_completed
+
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                log_futures = [
+                    pool.submit(process_log_file_by_cask, lp, target_user, brew_prefix)
+                    for lp in used_logs
+                ]
+                futures = {pool.submit(_process_cask, tok): tok for tok in thread_tokens}
+                for tok in own_tokens:
+                    if prefetched.get(tok):
+                        token_to_lines[tok] = _process_cask(tok)
+                for fut in as_completed(futures):
+                    token_to_lines[futures[fut]] = fut.result()
+                log_mappings = [fut.result() for fut in log_futures]
+        else:
+            # Fallback to sequential processing
+            for tok in own_tokens:
+                token_to_lines[tok] = _process_cask(tok)
+            for lp in used_logs:
+                log_mappings.append(
+                    process_log_file_by_cask(lp, target_user, brew_prefix)
+                )
+        if gen_pool is not None:
+            try:
+                generated = list(gen_results)
+            except BrokenProcessPool:
+                # A worker died; generate these casks here instead
+                generated = [
+                    generate_sudoers_for_cask(tok, cj, target_user, brew_prefix, swift_util)
+                    for tok, cj in pooled.items()
+                ]
+            for (tok, cj), rules in zip(pooled.items(), generated):
+                token_to_lines[tok] = _cask_lines(tok, cj, rules)
+    finally:
+        if gen_pool is not None:
+            gen_pool.shutdown()
+
+    # Merge the parsed logs into cask‑scoped extra rules, each kept in a
+    # dict used as an ordered set so repeats across logs are dropped.
+    extra_rules_by_cask: Dict[Optional[str], Dict[str, None]] = {}
+    for mapping in log_mappings:
         for cask_token, rules in mapping.items():
-            if cask_token not in extra_rules_by_cask:
-                extra_rules_by_cask[cask_token] = []
-            existing = set(extra_rules_by_cask[cask_token])
-            for r in rules:
-                if r not in existing:
-                    extra_rules_by_cask[cask_token].append(r)
-                    existing.add(r)
+            extra_rules_by_cask.setdefault(cask_token, {}).update(dict.fromkeys(rules))
     if not log_paths:
         sys.stderr.write(
             "[WARN] No log file specified or found. It is strongly recommended to specify a log via LOGS=path or place a .log file next to the sudoers output so that additional sudo commands can be captured. You can generate a log using reinstall_casks.py to reinstall your casks.\n"
@@ -1794,47 +2189,60 @@ def main() -> None:
             f"[WARN] Log file(s) specified but not found: {', '.join(log_paths)}\n"
         )
 
-    # Write the sudoers file
-    with open(sudoers_out, "w", encoding="utf-8") as fh:
-        fh.write(
-            "# ===== Homebrew Cask NOPASSWD rules (generated by gen_brew_cask_sudoers.py) =====\n"
+    # Assemble the sudoers file in an in-memory text buffer and write it
+    # with a single call rather than one write per rule.
+    buf = io.StringIO()
+    write = buf.write
+
+    def write_lines(lines: Iterable[str]) -> None:
+        # One joined write per block instead of two writes per line
+        lines = list(lines)
+        if lines:
+            write("\n".join(lines))
+            write("\n")
+
+    write_lines(
+        (
+            "# ===== Homebrew Cask NOPASSWD rules (generated by gen_brew_cask_sudoers.py) =====",
+            f"# Generated: {datetime.now():%Y-%m-%d %H:%M:%S}",
+            f"# Target user: {target_user}",
+            "",
         )
-        fh.write(f"# Generated: {run(['date', '+%Y-%m-%d %H:%M:%S'])}\n")
-        fh.write(f"# Target user: {target_user}\n\n")
-        # Write rules for each requested cask, inserting any associated log rules
-        for tok in tokens:
-            lines = token_to_lines.get(tok)
-            if not lines:
-                fh.write(f"# {tok}: failed to fetch metadata\n\n")
-                continue
-            # Write base lines
-            for ln in lines:
-                fh.write(ln + "\n")
-            # Append any extra log rules for this cask
-            extra = extra_rules_by_cask.get(tok)
-            if extra:
-                existing = set(l for l in lines if l and not l.startswith("#"))
-                for r in extra:
-                    if r not in existing:
-                        fh.write(r + "\n")
-                fh.write("\n")
-        # Handle casks that only appear in logs but were not processed above
-        for tok_key, rules in extra_rules_by_cask.items():
-            if tok_key is None:
-                continue
-            if tok_key in token_to_lines:
-                continue
-            header = f"# ----------------------------\n# {tok_key} ({tok_key})\n# ----------------------------"
-            fh.write(header + "\n")
-            for r in rules:
-                fh.write(r + "\n")
-            fh.write("\n")
-        # Write any global log rules
-        global_extra = extra_rules_by_cask.get(None)
-        if global_extra:
-            fh.write("# ----- Additional sudo commands from log -----\n")
-            for r in global_extra:
-                fh.write(r + "\n")
+    )
+    # Write rules for each requested cask, inserting any associated log rules
+    for tok in tokens:
+        lines = token_to_lines.get(tok)
+        if not lines:
+            write(f"# {tok}: failed to fetch metadata\n\n")
+            continue
+        # Write base lines
+        write_lines(lines)
+        # Append any extra log rules for this cask
+        extra = extra_rules_by_cask.get(tok)
+        if extra:
+            existing = set(l for l in lines if l and not l.startswith("#"))
+            write_lines(r for r in extra if r not in existing)
+            write("\n")
+    # Handle casks that only appear in logs but were not processed above
+    for tok_key, rules in extra_rules_by_cask.items():
+        if tok_key is None:
+            continue
+        if tok_key in token_to_lines:
+            continue
+        write(
+            f"# ----------------------------\n# {tok_key} ({tok_key})\n"
+            "# ----------------------------\n"
+        )
+        write_lines(rules)
+        write("\n")
+    # Write any global log rules
+    global_extra = extra_rules_by_cask.get(None)
+    if global_extra:
+        write("# ----- Additional sudo commands from log -----\n")
+        write_lines(global_extra)
+
+    with open(sudoers_out, "w", encoding="utf-8") as fh:
+        fh.write(buf.getvalue())
 
     print(f"✅ Generated sudoers snippet: {sudoers_out}")
 
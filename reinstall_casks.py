@@ -20,6 +20,11 @@ reinstallation process:
 
        brew reinstall --cask --verbose --debug <cask>
 
+   Setting the ``INSTALL_WORKERS`` environment variable to a number
+   greater than 1 reinstalls that many casks at a time instead; each
+   console line is then prefixed with the name of its cask, and each
+   cask's output is appended to the log as one block when it finishes.
+
    During installation, all output (including the command itself,
    verbose and debug output, and any error messages) is printed to
    the screen **and** appended to a log file named
@@ -27,9 +32,14 @@ reinstallation process:
    After each successful installation, the script records progress so
    that a later run resumes from where it left off.
 
-To persist progress across runs, a JSON state file is written in the
-current working directory.  It keeps track of which casks have been
-downloaded and which have been installed.
+To persist progress across runs, a JSON state file
+(``reinstall_casks_state.json``) is written in the current working
+directory.  It keeps track of which casks have been downloaded and which
+have been installed.  While the script runs, each completed download or
+install is also appended to an event log (``reinstall_casks_state.jsonl``),
+which is merged into the state file on exit.  A run that is killed may
+leave only the event log behind; it is still replayed on the next run, so
+delete both files to start from scratch.
 
 Note: Running this script will make changes to your system by
 reinstalling software.  Ensure that you have the necessary
@@ -39,12 +49,16 @@ privileges, but the install stage may prompt for a password if
 Homebrew requires one.
 """
 
+import atexit
 import json
+import shutil
 import subprocess
 import sys
+import tempfile
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List, Set, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 
 # Attempt to import tqdm for fancy progress bars.  If unavailable,
 # fall back to a simple console-based progress indicator.
@@ -54,14 +68,38 @@ except ImportError:  # pragma: no cover - handle missing dependency at runtime
     tqdm = None  # type: ignore[assignment]
 
 
+# Absolute path of the brew executable, resolved once.  subprocess only
+# uses the cheaper posix_spawn() for commands given with a directory (and
+# close_fds=False), so the fetch and reinstall workers run this path
+# rather than a bare "brew".  If brew is not on PATH, the bare name is
+# kept so the usual FileNotFoundError is raised.
+BREW = shutil.which("brew") or "brew"
+
 STATE_FILE = Path("reinstall_casks_state.json")
 
+# Progress made since the state file was last written, one JSON event per
+# line (e.g. ``{"event": "downloaded", "cask": "firefox"}``).  Appending an
+# event is cheap, so it is done after every download and install; the log
+# is folded back into STATE_FILE and removed when the script exits.
+STATE_EVENTS_FILE = STATE_FILE.with_suffix(".jsonl")
+
 # Maximum number of casks to download in parallel during the download phase.
 # You can adjust this value to control how many concurrent `brew fetch`
 # operations are run.  A higher number may speed up downloads on fast
 # connections but could consume more resources or lead to network throttling.
 MAX_DOWNLOAD_WORKERS = 32
 
+# Default number of casks to reinstall at the same time during the install
+# phase.  Override with the INSTALL_WORKERS environment variable.  The
+# default of 1 keeps the install output in one readable stream; with more
+# workers each console line is prefixed with its cask name, and the log
+# gets every cask's output as one untagged block when that cask finishes.
+DEFAULT_INSTALL_WORKERS = 1
+
+# Size of the reads used to copy `brew reinstall` output to the console
+# and the install log.
+OUTPUT_CHUNK_SIZE = 65536
+
 
 def get_installed_casks() -> List[str]:
     """Return a list of installed Homebrew Cask packages.
@@ -95,10 +133,12 @@ def get_installed_casks() -> List[str]:
 
 
 def load_state() -> Tuple[Set[str], Set[str]]:
-    """Load download/install progress from the state file.
+    """Load download/install progress from the state file and event log.
 
     Returns a tuple of two sets: (downloaded_casks, installed_casks).
     If the state file does not exist or is invalid, empty sets are returned.
+    Events recorded by :func:`record_event` since the state file was last
+    written are then applied on top; unreadable event lines are skipped.
     """
     downloaded: Set[str] = set()
     installed: Set[str] = set()
@@ -115,11 +155,31 @@ def load_state() -> Tuple[Set[str], Set[str]]:
                 f"Warning: Could not read state file {STATE_FILE}; starting with a fresh state.",
                 file=sys.stderr,
             )
+    if STATE_EVENTS_FILE.exists():
+        targets = {"downloaded": downloaded, "installed": installed}
+        try:
+            with STATE_EVENTS_FILE.open("r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        targets[entry["event"]].add(entry["cask"])
+                    except Exception:
+                        # A torn last line from an interrupted write
+                        continue
+        except OSError:
+            print(
+                f"Warning: Could not read state events file {STATE_EVENTS_FILE}.",
+                file=sys.stderr,
+            )
     return downloaded, installed
 
 
 def save_state(downloaded: Set[str], installed: Set[str]) -> None:
-    """Persist the download/install progress to the state file."""
+    """Persist the download/install progress to the state file.
+
+    The event log is removed afterwards, as everything it recorded is now
+    in the state file.
+    """
     try:
         with STATE_FILE.open("w", encoding="utf-8") as f:
             json.dump({"downloaded": sorted(downloaded), "installed": sorted(installed)}, f)
@@ -127,6 +187,28 @@ def save_state(downloaded: Set[str], installed: Set[str]) -> None:
         print(
             f"Warning: Failed to write state file {STATE_FILE}: {exc}", file=sys.stderr
         )
+        return
+    try:
+        STATE_EVENTS_FILE.unlink(missing_ok=True)
+    except OSError:
+        # Leftover events are replayed harmlessly by load_state
+        pass
+
+
+def record_event(event: str, cask: str) -> None:
+    """Append a single progress event ("downloaded" or "installed").
+
+    Unlike :func:`save_state`, this does not rewrite the whole state, so
+    it is cheap enough to call after every cask.
+    """
+    try:
+        with STATE_EVENTS_FILE.open("a", encoding="utf-8") as f:
+            f.write(json.dumps({"event": event, "cask": cask}) + "\n")
+    except Exception as exc:
+        print(
+            f"Warning: Failed to write state events file {STATE_EVENTS_FILE}: {exc}",
+            file=sys.stderr,
+        )
 
 
 def fetch_cask(cask: str) -> Tuple[str, bool]:
@@ -138,12 +220,17 @@ def fetch_cask(cask: str) -> Tuple[str, bool]:
     This function is intended to be run in a worker thread.
     """
     try:
-        # Suppress output from brew fetch by redirecting stdout and stderr to DEVNULL
+        # Suppress output from brew fetch by redirecting stdout and stderr to DEVNULL.
+        # Together with the absolute BREW path, close_fds=False lets
+        # subprocess use posix_spawn() for the many concurrent fetches.  It
+        # is safe because Python opens its own descriptors non-inheritable
+        # (PEP 446), so only the child's stdio is passed on.
         proc = subprocess.run(
-            ["brew", "fetch", "--cask", cask],
+            [BREW, "fetch", "--cask", cask],
             stdout=subprocess.DEVNULL,
             stderr=subprocess.DEVNULL,
             check=False,
+            close_fds=False,
         )
         success = proc.returncode == 0
         return cask, success
@@ -151,7 +238,9 @@ def fetch_cask(cask: str) -> Tuple[str, bool]:
         return cask, False
 
 
-def reinstall_cask(cask: str, log_file) -> None:
+def reinstall_cask(
+    cask: str, log_file, lock: Optional[threading.Lock] = None
+) -> None:
     """Reinstall a single cask using Homebrew.
 
     Executes `brew reinstall --cask --verbose --debug <cask>` and streams
@@ -162,32 +251,99 @@ def reinstall_cask(cask: str, log_file) -> None:
         log_file: A file-like object opened for appending where output
             should be recorded.  Each line printed to the screen will
             also be written to this file.
+        lock: Set when several casks are reinstalled concurrently.  Console
+            lines are then printed under the lock and prefixed with
+            ``[<cask>]``, while the log receives the cask's output as one
+            untagged block once it finishes, so that
+            ``generate_homebrew_sudoers.py`` can still attribute each
+            ``sudo`` line to the preceding ``Running command:`` marker.
     """
-    # Construct the command
+    # Construct the command.  The header keeps the bare "brew" name, as
+    # generate_homebrew_sudoers.py looks for "Running command: brew" in the
+    # log; the process itself is started from the resolved BREW path.
     cmd = ["brew", "reinstall", "--cask", "--verbose", "--debug", "--force", cask]
-    # Write the command itself to both destinations
     header = f"\nRunning command: {' '.join(cmd)}\n"
-    print(header, end="")
-    log_file.write(header)
-    log_file.flush()
-    # Start the process and stream output line by line
-    process = subprocess.Popen(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        text=True,
-    )
-    assert process.stdout is not None  # for type checkers
-    for line in process.stdout:
-        # Print to screen
-        print(line, end="")
-        # Append to log
-        log_file.write(line)
-    retcode = process.wait()
-    if retcode != 0:
-        err_msg = f"Error: Command for '{cask}' exited with return code {retcode}\n"
-        print(err_msg, file=sys.stderr, end="")
-        log_file.write(err_msg)
+    argv = [BREW, *cmd[1:]]
+    err_msg = ""
+    # close_fds=False as in fetch_cask, so posix_spawn() is used; the pipes
+    # and log file are non-inheritable, so concurrent reinstalls cannot
+    # hold each other's pipes open.
+    if lock is None:
+        # Write the command itself to both destinations
+        print(header, end="")
+        log_file.write(header)
+        log_file.flush()
+        # Start the process and copy its raw output through in chunks, as
+        # --verbose --debug produces thousands of lines per cask.  That needs
+        # the binary buffers beneath stdout and the log; text-only streams
+        # (e.g. io.StringIO or some IDE consoles) get the output line by line.
+        console = getattr(sys.stdout, "buffer", None)
+        log_bytes = getattr(log_file, "buffer", None)
+        chunked = console is not None and log_bytes is not None
+        process = subprocess.Popen(
+            argv,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=not chunked,
+            bufsize=0 if chunked else -1,
+            close_fds=False,
+        )
+        assert process.stdout is not None  # for type checkers
+        if chunked:
+            sys.stdout.flush()
+            while True:
+                # An unbuffered pipe returns whatever is available, so output
+                # still appears as brew produces it
+                chunk = process.stdout.read(OUTPUT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                console.write(chunk)
+                console.flush()
+                log_bytes.write(chunk)
+        else:
+            for line in process.stdout:
+                # Print to screen
+                print(line, end="")
+                # Append to log
+                log_file.write(line)
+        retcode = process.wait()
+        if retcode != 0:
+            err_msg = f"Error: Command for '{cask}' exited with return code {retcode}\n"
+            print(err_msg, file=sys.stderr, end="")
+            log_file.write(err_msg)
+        return
+
+    # Concurrent reinstall: tag console lines as they arrive, and collect
+    # the untagged log block in a temporary file until the cask is done.
+    tag = f"[{cask}] "
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as block:
+        block.write(header)
+        with lock:
+            print(f"\n{tag}{header[1:]}", end="")
+        process = subprocess.Popen(
+            argv,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            close_fds=False,
+        )
+        assert process.stdout is not None  # for type checkers
+        for line in process.stdout:
+            block.write(line)
+            with lock:
+                # A final line without a newline would run into the next
+                # cask's tagged output
+                print(tag + line, end="" if line.endswith("\n") else "\n")
+        retcode = process.wait()
+        if retcode != 0:
+            err_msg = f"Error: Command for '{cask}' exited with return code {retcode}\n"
+            block.write(err_msg)
+        block.seek(0)
+        with lock:
+            if err_msg:
+                print(tag + err_msg, file=sys.stderr, end="")
+            shutil.copyfileobj(block, log_file)
+            log_file.flush()
 
 
 def main() -> None:
@@ -252,6 +408,9 @@ def main() -> None:
 
     # Load previous state if available
     downloaded, installed = load_state()
+    # Progress is appended to the event log as it happens; fold it into the
+    # state file on any exit (including Ctrl-C).
+    atexit.register(save_state, downloaded, installed)
 
     # Phase 1: download any casks that haven't been fetched yet
     # Only consider casks selected for this run when calculating counts.
@@ -264,14 +423,15 @@ def main() -> None:
         # the number of parallel downloads based on the configured maximum.
         max_workers = min(MAX_DOWNLOAD_WORKERS, len(to_download))
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Map each future to the cask it will fetch
-            future_to_cask = {
-                executor.submit(fetch_cask, cask): cask for cask in to_download
-            }
+            # fetch_cask returns the cask name with its result, so the
+            # futures need no mapping back to their cask.  as_completed is
+            # kept (rather than executor.map) so progress and state follow
+            # completion order instead of stalling behind a slow download.
+            futures = [executor.submit(fetch_cask, cask) for cask in to_download]
             if tqdm:
                 # If tqdm is available, use it to display a detailed progress bar
                 with tqdm(total=len(to_download), desc=f"Downloading casks (0/{len(to_download)})") as pbar:
-                    for future in as_completed(future_to_cask):
+                    for future in as_completed(futures):
                         cask_name, success = future.result()
                         pbar.update(1)
                         # Update the description to reflect how many have been downloaded so far
@@ -280,8 +440,8 @@ def main() -> None:
                         )
                         if success:
                             downloaded.add(cask_name)
-                            # Persist the updated state after each successful download
-                            save_state(downloaded, installed)
+                            # Record each successful download as it happens
+                            record_event("downloaded", cask_name)
                 print("Download phase completed.")
             else:
                 # Fallback: simple console progress without tqdm
@@ -289,7 +449,7 @@ def main() -> None:
                 completed_tasks = 0
                 # Print initial progress
                 print(f"Downloading casks: {completed_tasks}/{total_tasks}", end="", flush=True)
-                for future in as_completed(future_to_cask):
+                for future in as_completed(futures):
                     cask_name, success = future.result()
                     completed_tasks += 1
                     # Move cursor to beginning of line and print updated count
@@ -300,7 +460,7 @@ def main() -> None:
                     )
                     if success:
                         downloaded.add(cask_name)
-                        save_state(downloaded, installed)
+                        record_event("downloaded", cask_name)
                 # Ensure the progress line ends cleanly
                 print()
                 print("Download phase completed.")
@@ -314,13 +474,38 @@ def main() -> None:
         print(
             f"Starting install phase: {len(to_install)} of {len(casks)} casks need to be reinstalled."
         )
+        # Number of concurrent reinstalls (INSTALL_WORKERS, default 1)
+        try:
+            install_workers = int(
+                os.environ.get("INSTALL_WORKERS") or DEFAULT_INSTALL_WORKERS
+            )
+        except ValueError:
+            install_workers = DEFAULT_INSTALL_WORKERS
         # Open a log file for appending installation output
         log_path = Path("reinstall_casks_install.log")
         with log_path.open("a", encoding="utf-8") as log_file:
-            for cask_name in to_install:
-                reinstall_cask(cask_name, log_file)
-                installed.add(cask_name)
-                save_state(downloaded, installed)
+            if install_workers > 1 and len(to_install) > 1:
+                # Reinstall several casks at once.  Output from the workers
+                # is serialised through a lock; state is only saved from
+                # this thread as each reinstall completes.
+                lock = threading.Lock()
+                with ThreadPoolExecutor(
+                    max_workers=min(install_workers, len(to_install))
+                ) as executor:
+                    future_to_cask = {
+                        executor.submit(reinstall_cask, cask, log_file, lock): cask
+                        for cask in to_install
+                    }
+                    for future in as_completed(future_to_cask):
+                        future.result()
+                        cask_name = future_to_cask[future]
+                        installed.add(cask_name)
+                        record_event("installed", cask_name)
+            else:
+                for cask_name in to_install:
+                    reinstall_cask(cask_name, log_file)
+                    installed.add(cask_name)
+                    record_event("installed", cask_name)
         print("Install phase completed.")
         print(f"Installation logs have been saved to {log_path.resolve()}")
     else: